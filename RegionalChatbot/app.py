@@ -1,16 +1,45 @@
 import streamlit as st
 import google.generativeai as genai
+import html
 import os
-import time
 import re
-from googletrans import Translator
+import uuid
+from functools import lru_cache
+import time
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from saanchari import metrics
+from saanchari.cache import MODEL, PASSAGE, PLANNED, answers
+from saanchari.cassette import replaying, wrap_model
+from saanchari.chat_pane import ChatPane, chat_pane
+from saanchari.engine import stream_reply
+from saanchari.followups import Prefetcher, suggest
+from saanchari.gazetteer import highlight
+from saanchari.images import DEFAULT_QUESTION, IMAGE_TYPES, photo_answer
+from saanchari.langdetect import answer_language, detect, needs_translation
+from saanchari.markdown import render_markdown
+from saanchari.models import ModelRouter
+from saanchari.persistence import ConversationStore, SessionReaper
+from saanchari.planner import decompose, planned_answer
+from saanchari.popular import queries
+from saanchari.ratelimit import upstream
+from saanchari.refresh import RefreshScheduler
+from saanchari.prompts import build_prompt, retrieve
+from saanchari.router import FAQ, KB, LLM, route
+from saanchari.store import MAX_SESSION_BYTES, MessageStore
+from saanchari.usage import FULL, LOCAL, SHORT, SHORT_OUTPUT_TOKENS, ledger
+from saanchari.worker import DONE, ERROR, FINISHED, GenerationJob
+
+# Count every full script execution and its CPU cost
+metrics.incr("script.runs")
+_run_cpu_start = time.thread_time()
 
 # Load environment variables and configure Gemini
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel("gemini-1.5-flash")
-else:
+elif not replaying():
     st.error("⚠️ GEMINI_API_KEY not found. Please add your API key to continue.")
     st.stop()
 
@@ -315,9 +344,6 @@ lang_map = {
     "Telugu": "te"
 }
 
-# Initialize translator
-translator = Translator()
-
 # Header at very top of screen
 col1, col2 = st.columns([3, 1])
 
@@ -351,10 +377,236 @@ builtin_questions = [
 ]
 
 # Initialize session state
+@st.cache_resource
+def conversation_backend():
+    """Process-wide conversation database and idle-session reaper"""
+    store = ConversationStore(os.getenv("SAANCHARI_DB", "saanchari_conversations.db"))
+    reaper = SessionReaper(idle_seconds=int(os.getenv("SAANCHARI_IDLE_SECONDS", "900")))
+    ledger.backend = store
+    return store, reaper
+
+@st.cache_resource
+def model_router():
+    """Process-wide model choice, so every session's latencies and errors inform it"""
+    if GEMINI_API_KEY:
+        return ModelRouter(lambda name: wrap_model(genai.GenerativeModel(name)))
+    return ModelRouter(lambda name: wrap_model(None, name))
+
+@st.cache_resource
+def prefetcher():
+    """Process-wide prefetch of suggested follow-ups, under one shared budget"""
+    return Prefetcher(model_router(), answers)
+
+@st.cache_resource
+def refresh_scheduler():
+    """Background refresh-ahead of popular answers, once per process"""
+    return RefreshScheduler(answers, model_router()).start()
+
+@st.cache_resource
+def warm_answers():
+    """Preload answers written by `python -m saanchari.batch`, once per process"""
+    path = os.getenv("SAANCHARI_ANSWERS")
+    return answers.load(path) if path and os.path.exists(path) else 0
+
+def open_conversation():
+    """Resume the conversation named in the URL, or start a new one"""
+    backend, reaper = conversation_backend()
+    max_bytes = int(os.getenv("SAANCHARI_SESSION_MAX_BYTES", MAX_SESSION_BYTES))
+    conversation_id = st.query_params.get("c", "")
+    if re.fullmatch(r"[0-9a-f]{32}", conversation_id):
+        store = MessageStore.restore(conversation_id, backend, max_bytes=max_bytes)
+    else:
+        conversation_id = uuid.uuid4().hex
+        st.query_params["c"] = conversation_id
+        store = MessageStore(max_bytes=max_bytes, conversation_id=conversation_id, backend=backend)
+    reaper.register(store)
+    return store
+
+warm_answers()
+refresh_scheduler()
 if "messages" not in st.session_state:
-    st.session_state.messages = []
-if "is_generating" not in st.session_state:
-    st.session_state.is_generating = False
+    st.session_state.messages = open_conversation()
+if "job" not in st.session_state:
+    st.session_state.job = None
+if "pane" not in st.session_state:
+    st.session_state.pane = ChatPane()
+if "suggestions" not in st.session_state:
+    st.session_state.suggestions = []
+if "photo" not in st.session_state:
+    st.session_state.photo = None
+
+# Streamed text is coalesced into at most MAX_FPS chat updates per second
+MAX_FPS = float(os.getenv("SAANCHARI_MAX_FPS", "12"))
+POLL_SECONDS = 1 / MAX_FPS
+
+def cancel_generation(reason):
+    """Abandon the answer currently being produced for this session, if any"""
+    job = st.session_state.job
+    if job is not None:
+        job.cancel(reason)
+        st.session_state.job = None
+
+def session_probe():
+    """Build a check the worker can call to notice that this tab was closed"""
+    ctx = get_script_run_ctx()
+    session_id = ctx.session_id if ctx else None
+    
+    def is_alive():
+        if session_id is None or not runtime.exists():
+            return True
+        return runtime.get_instance().is_active_session(session_id)
+    
+    return is_alive
+
+PHOTO_MARK = "📷 "
+
+def submit_question(question, photo=None):
+    """Widget callback: record the question (and the bytes of an attached photo) before the script reruns"""
+    cancel_generation("superseded")
+    st.session_state.suggestions = []
+    st.session_state.photo = photo
+    st.session_state.messages.add("user", PHOTO_MARK + question if photo else question)
+
+def offer_followups(question, lang, answer):
+    """Suggest next questions under the latest answer and prefetch the likeliest"""
+    suggestions = suggest(question, answer, lang)
+    st.session_state.suggestions = [s.label for s in suggestions]
+    prefetcher().offer(st.session_state.messages.conversation_id, suggestions)
+
+def submit_chat_input():
+    prompt = st.session_state.chat_prompt
+    if not prompt:
+        return
+    text = prompt.text.strip()
+    if prompt.files:
+        submit_question(text or DEFAULT_QUESTION, photo=prompt.files[0].getvalue())
+    elif text:
+        submit_question(text)
+
+# Split compound questions into concurrently answered parts (SAANCHARI_PLANNER=0 turns it off)
+PLANNER = os.getenv("SAANCHARI_PLANNER", "1") != "0"
+
+BUDGET_REPLY = (
+    "You've asked a lot of questions in this conversation, so I'm answering from my saved guides for now. "
+    "Try asking about a specific **place**, **dish** or **festival** in **Andhra Pradesh**."
+)
+
+def start_generation():
+    """Hand the pending user question to a background worker"""
+    messages = st.session_state.messages
+    # Called on every poll, so reading the transcript must not keep an idle session in memory
+    last = messages.last()
+    if last is None or last.role != "user" or st.session_state.job is not None:
+        return
+    question = last.content
+    photo = st.session_state.photo
+    if photo is not None:
+        st.session_state.photo = None
+        question = question.removeprefix(PHOTO_MARK)
+    
+    # Answer in the language the question was typed in, whatever the selector says
+    detection = detect(question)
+    lang = answer_language(detection, lang_map[selected_lang])
+    metrics.incr(f"langdetect.{detection.lang}.{detection.script}")
+    
+    session = messages.conversation_id
+    
+    # Photos go to the multimodal model, unless the same or a similar photo was asked about before
+    if photo is not None:
+        if ledger.plan(session) == LOCAL:
+            messages.add("assistant", BUDGET_REPLY)
+            return
+        upstream.take()
+        st.session_state.job = GenerationJob(
+            None,
+            None,
+            dest_lang=lang,
+            is_alive=session_probe(),
+            question=question,
+            stream=photo_answer(photo, question, model_router(),
+                                on_usage=lambda name, usage: ledger.record(session, "photo", name, usage)),
+        ).start()
+        return
+    
+    # Settle the suggestions offered under the last answer (hit, joined or wasted)
+    pending = prefetcher().claim(session, question, lang)
+    
+    # Greetings, off-topic questions and cached answers never reach the model
+    decision = route(question, lang)
+    if decision.route not in (KB, LLM):
+        ledger.record(session, decision.route, None)
+        messages.add("assistant", decision.reply)
+        if decision.route == FAQ:
+            queries.add(question, lang)
+            offer_followups(question, lang, decision.reply)
+        return
+    queries.add(question, lang)
+    
+    # Sessions past their token budget get shorter answers, then none from the model
+    reply, prompt, choice, generation_config, stream = decision.reply, None, None, None, None
+    plan = ledger.plan(session) if decision.route == LLM else None
+    parts = decompose(question) if PLANNER and plan == FULL else []
+    if pending is not None and decision.route == LLM:
+        # A clicked suggestion whose prefetch is still running is awaited, not asked again
+        choice = model_router().choose(pending.suggestion.question)
+        
+        def answer_live(token):
+            # The prefetch failed or was cancelled, so the suggestion is answered as if never prefetched
+            upstream.take()
+            return stream_reply(choice.model, build_prompt(pending.suggestion.question), token,
+                                record_usage, choice.generation_config)
+        
+        stream = lambda token: pending.join(token, fallback=answer_live)
+        ledger.record(session, "prefetch", None)
+    elif plan == LOCAL:
+        passages = retrieve(question)
+        reply = f"### {passages[0]['title']}\n\n{passages[0]['text']}" if passages else BUDGET_REPLY
+        ledger.record(session, "budget", None)
+    elif parts:
+        # Compound questions are answered part by part, concurrently, as ordered sections
+        stream = planned_answer(parts, model_router(), answers,
+                                lambda name, usage: ledger.record(session, LLM, name, usage))
+        upstream.take(len(parts))
+    elif decision.route == LLM:
+        # Model and answer length follow the question's complexity and each model's health
+        choice = model_router().choose(question)
+        generation_config = choice.generation_config
+        upstream.take()
+        brief = plan == SHORT
+        if brief:
+            generation_config = {"max_output_tokens": min(SHORT_OUTPUT_TOKENS, choice.max_output_tokens)}
+        # Telugu or Hindi script questions are translated before retrieval, on the worker
+        if needs_translation(detection):
+            prompt = lambda english: build_prompt(english, brief=brief)
+        else:
+            prompt = build_prompt(question, brief=brief)
+    else:
+        ledger.record(session, KB, None)
+    if plan:
+        metrics.incr(f"usage.plan.{plan}")
+    # Only full answers are shared with other sessions; joined prefetches were cached by the prefetcher
+    cacheable = decision.route == KB or (plan == FULL and pending is None)
+    source = PASSAGE if decision.route == KB else PLANNED if parts else MODEL
+    
+    def cache_answer(text):
+        answers.put(question, lang, text, source=source)
+    
+    def record_usage(usage):
+        ledger.record(session, LLM, choice.name, usage)
+    
+    st.session_state.job = GenerationJob(
+        choice.model if choice else None,
+        prompt,
+        dest_lang=lang,
+        is_alive=session_probe(),
+        reply=reply,
+        on_done=cache_answer if cacheable else None,
+        question=question,
+        source_lang=detection.lang,
+        generation_config=generation_config,
+        on_usage=record_usage,
+        stream=stream,
+    ).start()
 
 # Quick Questions - Always visible but compact
 st.markdown("<div style='text-align: center; margin: 0.5rem 0 1rem 0;'>", unsafe_allow_html=True)
@@ -363,72 +615,48 @@ st.markdown("<p style='color: #07546B; font-size: 1rem; font-weight: 600; margin
 cols = st.columns(len(builtin_questions))
 for i, question in enumerate(builtin_questions):
     with cols[i]:
-        if st.button(
+        st.button(
             question, 
             key=f"q_{i}", 
             use_container_width=True,
-            help=f"Ask: {question}"
-        ):
-            st.session_state.messages.append({"role": "user", "content": question})
-            st.rerun()
+            help=f"Ask: {question}",
+            on_click=submit_question,
+            args=(question,)
+        )
 
 st.markdown("</div>", unsafe_allow_html=True)
 
 # Chat Area
 st.markdown("<div class='chat-area'>", unsafe_allow_html=True)
 
-def display_message(role, content, is_streaming=False):
+def message_html(role, body, is_streaming=False):
     avatar_class = "user-avatar" if role == "user" else "bot-avatar"
     message_class = "user-message" if role == "user" else "bot-message"
     avatar_icon = "👤" if role == "user" else "🤖"
     
     cursor = "<span class='typing-cursor' style='animation: blink 1s infinite;'>▋</span>" if is_streaming else ""
     
-    # Convert markdown bold to HTML for better formatting
-    if role == "assistant":
-        content = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', content)
-        content = re.sub(r'\*(.*?)\*', r'<em>\1</em>', content)
-        
-        # Convert bullet points to proper HTML lists
-        lines = content.split('\n')
-        formatted_lines = []
-        in_list = False
-        
-        for line in lines:
-            line = line.strip()
-            if line.startswith('• ') or line.startswith('- '):
-                if not in_list:
-                    formatted_lines.append('<ul>')
-                    in_list = True
-                formatted_lines.append(f'<li>{line[2:]}</li>')
-            elif line.startswith(('1. ', '2. ', '3. ', '4. ', '5. ', '6. ', '7. ', '8. ', '9. ')):
-                if not in_list:
-                    formatted_lines.append('<ol>')
-                    in_list = True
-                formatted_lines.append(f'<li>{line[3:]}</li>')
-            else:
-                if in_list:
-                    formatted_lines.append('</ul>' if formatted_lines[-2].startswith('<ul>') else '</ol>')
-                    in_list = False
-                if line:
-                    formatted_lines.append(f'<p>{line}</p>')
-        
-        if in_list:
-            formatted_lines.append('</ul>')
-        
-        content = ''.join(formatted_lines)
-    
     return f"""
         <div class='message-wrapper'>
             <div class='message-container'>
                 <div class='message-avatar {avatar_class}'>{avatar_icon}</div>
                 <div class='message-content {message_class}'>
-                    {content}{cursor}
+                    {body}{cursor}
                 </div>
             </div>
         </div>
     """
 
+def display_message(role, content, is_streaming=False):
+    # Convert markdown (bold, italics, headings, lists) to HTML for bot replies,
+    # bolding the places, dishes and festivals it mentions
+    if role == "assistant":
+        content = render_markdown(highlight(content))
+    else:
+        # User text is shown as typed, never interpreted as HTML
+        content = html.escape(content)
+    return message_html(role, content, is_streaming)
+
 def display_typing_indicator():
     return """
         <div class='typing-container'>
@@ -444,55 +672,112 @@ def display_typing_indicator():
         </div>
     """
 
-# Display all messages
-chat_html = ""
-for message in st.session_state.messages:
-    chat_html += display_message(message["role"], message["content"])
+@lru_cache(maxsize=512)
+def render_message(role, content):
+    """HTML for a finished message; cached since history is re-rendered on every poll"""
+    return display_message(role, content)
 
-chat_placeholder = st.empty()
-chat_placeholder.markdown(chat_html, unsafe_allow_html=True)
+def display_stream_shell():
+    """Empty streaming bot message that the chat pane fills with text deltas"""
+    return message_html(
+        "assistant",
+        "<div class='stream-body'></div><div class='stream-tail'></div>",
+        is_streaming=True
+    )
 
-st.markdown("</div>", unsafe_allow_html=True)
+start_generation()
 
-# System prompt
-SYSTEM_PROMPT = (
-    "You are Saanchari, an expert AI guide for Andhra Pradesh tourism, culture, and cuisine. "
-    "Provide detailed, helpful, and enthusiastic information about tourist destinations, food, culture, "
-    "transportation, accommodation, and travel tips for Andhra Pradesh. "
-    "Be conversational, friendly, and informative in your responses. "
-    "When discussing food, include regional specialties and where to find them. "
-    "IMPORTANT: Always format your responses as bullet points or numbered lists. Never use long paragraphs. "
-    "Use **bold formatting** for key points, place names, food items, and important information. "
-    "Structure your responses with clear headings and bullet points. "
-    "Make the text easy to scan and read quickly with short, concise bullet points."
-)
+# Only full runs register or clear the poll timer, so it keeps firing until the next full run
+st.session_state.polling = st.session_state.job is not None
 
-def stream_response(text, delay=0.04):
-    """Stream text word by word with realistic typing effect"""
-    words = text.split()
-    displayed_text = ""
+@st.fragment(run_every=POLL_SECONDS if st.session_state.polling else None)
+def chat_area():
+    """Render the transcript, whatever the worker has produced so far, and follow-up suggestions"""
+    metrics.incr("fragment.runs")
+    # Follow-ups are clicked inside the fragment, so their questions start here without a full run
+    start_generation()
+    if st.session_state.job is not None and not st.session_state.polling:
+        # The last full run was idle and registered no poll timer
+        st.rerun()
+    pane = st.session_state.pane
+    messages = st.session_state.messages
+    pane.handle_client(st.session_state.get("chat_pane"), messages, render_message)
+    job = st.session_state.job
+    status, text = None, ""
     
-    # Show typing indicator first
-    typing_html = chat_html + display_typing_indicator()
-    chat_placeholder.markdown(typing_html, unsafe_allow_html=True)
-    time.sleep(1.2)
+    if job is not None:
+        status, text = job.buffer.snapshot()
+        if status in FINISHED:
+            st.session_state.job = None
+            if status == DONE:
+                messages.add("assistant", text.strip())
+                offer_followups(job.question, job.dest_lang, text)
+            elif status == ERROR:
+                error_msg = f"⚠️ Sorry, I encountered an error: {job.buffer.error}"
+                messages.add("assistant", error_msg)
+            # One full run renders the answer and stops the poll timer, so idle tabs send nothing
+            st.rerun()
     
-    # Stream words one by one
-    for word in words:
-        displayed_text += word + " "
-        
-        # Update with streaming message
-        streaming_html = chat_html + display_message("assistant", displayed_text, is_streaming=True)
-        chat_placeholder.markdown(streaming_html, unsafe_allow_html=True)
-        
-        time.sleep(delay + (0.01 if len(word) > 6 else 0))
+    # Only the events since the last render travel to the browser
+    pane.sync(
+        messages,
+        render_message,
+        status=status,
+        text=text,
+        typing_html=display_typing_indicator(),
+        stream_shell=display_stream_shell()
+    )
+    chat_pane(pane, key="chat_pane")
     
-    return displayed_text.strip()
+    # Suggested follow-ups for the latest answer, usually already answered in the background
+    suggestions = st.session_state.suggestions
+    if suggestions and st.session_state.job is None:
+        cols = st.columns(len(suggestions))
+        for i, question in enumerate(suggestions):
+            with cols[i]:
+                st.button(
+                    question,
+                    key=f"followup_{i}",
+                    use_container_width=True,
+                    on_click=submit_question,
+                    args=(question,)
+                )
+
+chat_area()
+
+st.markdown("</div>", unsafe_allow_html=True)
 
 # Chat input
-if prompt := st.chat_input("Ask me anything about Andhra Pradesh tourism... 🏛️"):
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    st.rerun()
+st.chat_input(
+    "Ask me anything about Andhra Pradesh tourism... 🏛️",
+    key="chat_prompt",
+    accept_file=True,
+    file_type=IMAGE_TYPES,
+    on_submit=submit_chat_input
+)
+
+# Admin view of the hottest questions: open the app with ?admin=<SAANCHARI_ADMIN_KEY>
+ADMIN_KEY = os.getenv("SAANCHARI_ADMIN_KEY")
+if ADMIN_KEY and st.query_params.get("admin") == ADMIN_KEY:
+    with st.sidebar:
+        st.markdown("### 🔥 Top questions")
+        now = time.time()
+        st.dataframe(
+            [
+                {
+                    "Question": hot.question,
+                    "Asked": hot.count,
+                    "Asked in": ", ".join(sorted(hot.langs)),
+                    "Cached in": ", ".join(
+                        lang for lang in lang_map.values()
+                        if (entry := answers.entry(hot.question, lang)) and entry.expires > now
+                    ),
+                }
+                for hot in queries.top(20)
+            ],
+            hide_index=True,
+            use_container_width=True
+        )
 
 # Footer at bottom of screen below chat typing box
 st.markdown("""
@@ -518,35 +803,4 @@ st.markdown("""
     <div style='height: 60px;'></div>
 """, unsafe_allow_html=True)
 
-# Generate response
-if st.session_state.messages and st.session_state.messages[-1]["role"] == "user" and not st.session_state.is_generating:
-    st.session_state.is_generating = True
-    
-    try:
-        user_prompt = st.session_state.messages[-1]["content"]
-        full_prompt = f"{SYSTEM_PROMPT}\n\nUser question: {user_prompt}"
-        
-        response = model.generate_content(full_prompt)
-        reply = response.text.strip()
-        
-        # Translate if needed
-        if lang_map[selected_lang] != "en":
-            reply = translator.translate(reply, dest=lang_map[selected_lang]).text
-        
-        # Stream the response
-        final_reply = stream_response(reply)
-        
-        # Add to session state
-        st.session_state.messages.append({"role": "assistant", "content": final_reply})
-        
-    except Exception as e:
-        error_msg = f"⚠️ Sorry, I encountered an error: {str(e)}"
-        st.session_state.messages.append({"role": "assistant", "content": error_msg})
-    
-    finally:
-        st.session_state.is_generating = False
-        # Final display
-        final_chat_html = ""
-        for message in st.session_state.messages:
-            final_chat_html += display_message(message["role"], message["content"])
-        chat_placeholder.markdown(final_chat_html, unsafe_allow_html=True)
\ No newline at end of file
+metrics.observe("script.cpu_seconds", time.thread_time() - _run_cpu_start)
@@ -0,0 +1,371 @@
+"""Headless HTTP API over the chat engine, streaming answers as Server-Sent Events.
+
+    POST /v1/chat     {"question": "...", "lang": "te"}    -> text/event-stream
+    GET  /v1/chat?q=...&lang=te                           -> text/event-stream (EventSource)
+    GET  /healthz
+    GET  /metrics
+
+Events, in order: `meta` (route and language), one or more `delta` (markdown
+text), then `done` (full markdown plus rendered HTML) or `error`. `lang` is
+en, hi or te; without it the answer follows the language of the question.
+
+Each stream is a coroutine on the server's event loop, so one process holds
+hundreds of them; routing, the answer cache and retrieval indexes are the same
+process-wide objects the Streamlit app uses.
+
+    python -m saanchari.api serve [port] [--fake]
+    python -m saanchari.api bench [streams] [--url http://127.0.0.1:8000]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from . import cassette, engine, metrics
+from .cache import MODEL, PASSAGE, answers
+from .cancel import CancelToken, GenerationCancelled
+from .gazetteer import highlight
+from .langdetect import answer_language, detect, needs_translation
+from .markdown import render_markdown
+from .models import ModelRouter
+from .prompts import build_prompt
+from .ratelimit import upstream
+from .router import KB, LLM, route
+from .usage import ledger
+
+LANGUAGES = ("en", "hi", "te")
+MODEL_NAME = "gemini-1.5-flash"
+MAX_BODY_BYTES = 16 * 1024
+MAX_QUESTION_CHARS = 2000
+
+SSE_HEADERS = [
+    (b"content-type", b"text/event-stream; charset=utf-8"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+]
+
+
+class BadRequest(Exception):
+    pass
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+
+def default_models():
+    """ModelRouter over Gemini clients, or over the cassette when replaying without a key."""
+    import google.generativeai as genai
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if api_key:
+        genai.configure(api_key=api_key)
+        return ModelRouter(lambda name: cassette.wrap_model(genai.GenerativeModel(name)))
+    if cassette.replaying():
+        return ModelRouter(lambda name: cassette.wrap_model(None, name))
+    raise RuntimeError("GEMINI_API_KEY is not set")
+
+
+class ChatService:
+    """The app's answer pipeline as an async event stream, for any number of concurrent callers."""
+
+    def __init__(self, model=None, translator=None, cache=None, limiter=None, models=None):
+        # A fixed `model` (e.g. a fake) bypasses the per-question ModelRouter
+        self._model = model
+        self._models = models
+        self._translator = translator
+        self.cache = answers if cache is None else cache
+        # Optional TokenBucket every model and translation call waits on
+        self.limiter = limiter
+
+    @property
+    def models(self):
+        if self._models is None:
+            self._models = default_models()
+        return self._models
+
+    def pick_model(self, question):
+        """(model, model name, generation_config) for `question`."""
+        if self._model is not None:
+            return self._model, getattr(self._model, "model_name", MODEL_NAME), None
+        choice = self.models.choose(question)
+        return choice.model, choice.name, choice.generation_config
+
+    @property
+    def translator(self):
+        # Created on the serving loop: its HTTP client must not be shared across loops
+        if self._translator is None:
+            from googletrans import Translator
+
+            self._translator = cassette.wrap_translator(Translator())
+        return self._translator
+
+    async def translate(self, text, dest, src="en"):
+        if self.limiter is not None:
+            await self.limiter.acquire()
+        return await engine.translate_text(text, dest, src=src, translator=self.translator)
+
+    async def answer(self, question, lang=None, token=None, session="api"):
+        """Yield (event, data) pairs answering `question`; model usage is booked to `session`."""
+        token = token or CancelToken()
+        detection = detect(question)
+        lang = lang or answer_language(detection, "en")
+        decision = route(question, lang, self.cache)
+        yield "meta", {"route": decision.route, "lang": lang, "detected": detection.lang}
+
+        reply = decision.reply
+        if decision.route == LLM:
+            english = question
+            if needs_translation(detection):
+                english = await self.translate(question, "en", src=detection.lang)
+            if self.limiter is not None:
+                await self.limiter.acquire()
+            upstream.take()
+            model, model_name, generation_config = self.pick_model(english)
+
+            def record_usage(usage):
+                ledger.record(session, LLM, model_name, usage)
+
+            parts = []
+            stream = engine.stream_reply(model, build_prompt(english), token, record_usage, generation_config)
+            async for text in stream:
+                parts.append(text)
+                if lang == "en":
+                    yield "delta", {"text": text}
+            reply = "".join(parts).strip()
+        elif decision.route == KB and lang == "en":
+            yield "delta", {"text": reply}
+        if decision.route in (KB, LLM):
+            if lang != "en":
+                token.raise_if_cancelled("translate")
+                reply = await self.translate(reply, lang)
+                yield "delta", {"text": reply}
+            self.cache.put(question, lang, reply, source=MODEL if decision.route == LLM else PASSAGE)
+        else:
+            yield "delta", {"text": reply}
+        engine.record_completed(token)
+        yield "done", {"text": reply, "html": render_markdown(highlight(reply))}
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise GenerationCancelled("request", "disconnected")
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise BadRequest("request body too large")
+        if not message.get("more_body"):
+            return body
+
+
+def _parse_chat(method, query, body):
+    if method == "POST":
+        try:
+            params = json.loads(body or b"{}")
+        except ValueError:
+            raise BadRequest("body must be JSON")
+        if not isinstance(params, dict):
+            raise BadRequest("body must be a JSON object")
+    else:
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+    question = str(params.get("question") or params.get("q") or "").strip()
+    lang = params.get("lang") or None
+    if not question:
+        raise BadRequest("question is required")
+    if len(question) > MAX_QUESTION_CHARS:
+        raise BadRequest("question is too long")
+    if lang not in (None, *LANGUAGES):
+        raise BadRequest(f"lang must be one of {', '.join(LANGUAGES)}")
+    return question, lang
+
+
+async def _watch_disconnect(receive, token):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            token.cancel("disconnected")
+            return
+
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def create_app(model=None, translator=None, cache=None):
+    """ASGI application serving a ChatService."""
+    service = ChatService(model, translator, cache)
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while (await receive())["type"] != "lifespan.shutdown":
+                await send({"type": "lifespan.startup.complete"})
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+        if scope["type"] != "http":
+            return
+        path, method = scope["path"], scope["method"]
+        if path == "/healthz":
+            return await _send_json(send, 200, {"status": "ok"})
+        if path == "/metrics":
+            return await _send_json(send, 200, metrics.snapshot())
+        if path != "/v1/chat":
+            return await _send_json(send, 404, {"error": "not found"})
+        if method not in ("GET", "POST"):
+            return await _send_json(send, 405, {"error": "method not allowed"})
+        try:
+            body = await _read_body(receive) if method == "POST" else b""
+            question, lang = _parse_chat(method, scope.get("query_string", b"").decode(), body)
+        except BadRequest as e:
+            return await _send_json(send, 400, {"error": str(e)})
+        except GenerationCancelled:
+            return
+        await _stream(service, question, lang, receive, send)
+
+    app.service = service
+    return app
+
+
+async def _stream(service, question, lang, receive, send):
+    metrics.incr("api.streams")
+    token = CancelToken()
+    watcher = asyncio.ensure_future(_watch_disconnect(receive, token))
+    started = time.perf_counter()
+    first = None
+    stage = "generate"
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": SSE_HEADERS})
+        async for event, data in service.answer(question, lang, token):
+            if event == "delta" and first is None:
+                first = time.perf_counter() - started
+                metrics.observe("api.first_delta_seconds", first)
+            await send({"type": "http.response.body", "body": sse(event, data), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+        metrics.observe("api.stream_seconds", time.perf_counter() - started)
+    except GenerationCancelled as e:
+        stage = e.stage
+        engine.record_cancelled(token, stage)
+        metrics.incr("api.disconnected")
+    except OSError:
+        engine.record_cancelled(token, stage)
+        metrics.incr("api.disconnected")
+    except Exception as e:
+        metrics.incr("api.errors")
+        try:
+            await send({"type": "http.response.body", "body": sse("error", {"error": str(e)})})
+        except OSError:
+            pass
+    finally:
+        watcher.cancel()
+
+
+async def _drive_in_process(app, question, lang):
+    """Run one request straight through the ASGI callable; returns (first delta, total) seconds."""
+    body = json.dumps({"question": question, "lang": lang}).encode()
+    scope = {"type": "http", "method": "POST", "path": "/v1/chat", "query_string": b"", "headers": []}
+    finished = asyncio.Event()
+    pending = [{"type": "http.request", "body": body, "more_body": False}]
+    started = time.perf_counter()
+    first = None
+
+    async def receive():
+        if pending:
+            return pending.pop()
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal first
+        if first is None and b"event: delta" in message.get("body", b""):
+            first = time.perf_counter() - started
+
+    await app(scope, receive, send)
+    finished.set()
+    return first, time.perf_counter() - started
+
+
+async def _drive_http(url, question, lang):
+    """One request over a raw socket; a full HTTP client would dominate the measurement."""
+    parts = urlsplit(url)
+    body = json.dumps({"question": question, "lang": lang}).encode()
+    started = time.perf_counter()
+    first = None
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    writer.write(
+        f"POST /v1/chat HTTP/1.1\r\nHost: {parts.netloc}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+    )
+    async for line in reader:
+        if first is None and line.startswith(b"event: delta"):
+            first = time.perf_counter() - started
+    writer.close()
+    return first, time.perf_counter() - started
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def _bench(streams, url=None):
+    from . import kb
+    from .cache import AnswerCache
+    from .fakes import FakeModel, FakeTranslator
+
+    model = FakeModel()
+    langs = ("en", "en", "te", "hi")
+    # Distinct questions so every stream reaches the (fake) model
+    questions = [(f"{kb.SAMPLE_QUERIES[i % len(kb.SAMPLE_QUERIES)]} {i}", langs[i % len(langs)])
+                 for i in range(streams)]
+    if url is None:
+        app = create_app(model, FakeTranslator(), AnswerCache())
+        calls = [_drive_in_process(app, q, lang) for q, lang in questions]
+    else:
+        calls = [_drive_http(url, q, lang) for q, lang in questions]
+    started = time.perf_counter()
+    results = await asyncio.gather(*calls)
+    wall = time.perf_counter() - started
+    chunks = len(list(model._chunks()))
+    ideal = model.first_token + (chunks - 1) * model.chunk_delay
+    print(f"{streams} concurrent streams in {wall:.2f}s ({streams / wall:.0f} streams/s); "
+          f"fake model alone takes {model.first_token * 1000:.0f} ms to first chunk, {ideal * 1000:.0f} ms in all")
+    for lang in sorted(set(langs)):
+        group = [result for result, (_, l) in zip(results, questions) if l == lang]
+        firsts = [first for first, _ in group if first is not None]
+        totals = [total for _, total in group]
+        print(f"  {lang}: {len(group):>4} streams  first delta p50 {_percentile(firsts, 0.5) * 1000:4.0f} ms "
+              f"p95 {_percentile(firsts, 0.95) * 1000:4.0f} ms  full answer p50 {_percentile(totals, 0.5) * 1000:4.0f} ms "
+              f"p95 {_percentile(totals, 0.95) * 1000:4.0f} ms")
+
+
+def main(argv):
+    command = argv[0] if argv else "serve"
+    args = [arg for arg in argv[1:] if not arg.startswith("--")]
+    if command == "serve":
+        import uvicorn
+
+        if "--fake" in argv:
+            from .fakes import FakeModel, FakeTranslator
+
+            app = create_app(FakeModel(), FakeTranslator())
+        else:
+            app = create_app()
+        uvicorn.run(app, host="0.0.0.0", port=int(args[0]) if args else 8000, log_level="warning")
+    elif command == "bench":
+        url = argv[argv.index("--url") + 1] if "--url" in argv else None
+        args = [arg for arg in args if arg != url]
+        asyncio.run(_bench(int(args[0]) if args else 500, url))
+    else:
+        print(__doc__)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
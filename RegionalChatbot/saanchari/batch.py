@@ -0,0 +1,197 @@
+"""Answer a file of questions in every language, concurrently, for cache warming and review.
+
+    python -m saanchari.batch questions.txt answers.jsonl [--langs en,hi,te]
+        [--concurrency 16] [--rate 2] [--fake]
+
+Input is one question per line (blank lines and # comments skipped) or JSONL
+with a "question" field. Each question goes through the same pipeline as the
+app (routing, grounded SYSTEM_PROMPT, translation) once in English; the other
+languages translate that answer. Output is one JSON record per question and
+language, appended and flushed as soon as it is ready, so rerunning with the
+same output file resumes an interrupted run and retries failures.
+AnswerCache.load() reads the output back.
+
+    python -m saanchari.batch check
+
+checks that a rewording of an early question, asked after more distinct
+questions than the app's answer cache holds, is answered from the batch's
+own cache without a model call.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .api import ChatService
+from .cache import MAX_ENTRIES, AnswerCache, cache_key
+from .ratelimit import TokenBucket
+from .router import CANNED, OFFTOPIC, classify
+
+LANGUAGES = ("en", "hi", "te")
+
+
+def read_questions(path):
+    questions = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        questions.append(json.loads(line)["question"] if line.startswith("{") else line)
+    return list(dict.fromkeys(questions))
+
+
+def read_checkpoint(path):
+    """Successful records already written, by (question, lang)."""
+    done = {}
+    if Path(path).exists():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by an interruption
+                if not record.get("error"):
+                    done[record["question"], record["lang"]] = record
+    return done
+
+
+def make_record(question, lang, route, text=None, seconds=0.0, error=None):
+    record = {
+        "question": question,
+        "lang": lang,
+        "key": cache_key(question),
+        "route": route,
+        "cacheable": route not in (CANNED, OFFTOPIC),
+        "text": text,
+        "seconds": round(seconds, 3),
+    }
+    if error is not None:
+        record["error"] = error
+    return record
+
+
+class BatchRunner:
+    def __init__(self, service, langs=LANGUAGES, concurrency=16):
+        self.service = service
+        self.langs = langs
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.written = 0
+        self.errors = 0
+
+    async def _english(self, question, done):
+        record = done.get((question, "en"))
+        if record is not None:
+            return record["route"], record["text"]
+        meta, text = {}, None
+        async for event, data in self.service.answer(question, "en", session="batch"):
+            if event == "meta":
+                meta = data
+            elif event == "done":
+                text = data["text"]
+        return meta["route"], text
+
+    async def _other(self, question, lang, route, english):
+        started = time.perf_counter()
+        if route in (CANNED, OFFTOPIC):
+            text = classify(question, lang, self.service.cache).reply
+        else:
+            text = await self.service.translate(english, lang)
+        return make_record(question, lang, route, text, time.perf_counter() - started)
+
+    async def answer(self, question, done, out):
+        todo = [lang for lang in self.langs if (question, lang) not in done]
+        if not todo:
+            return
+        async with self.semaphore:
+            started = time.perf_counter()
+            try:
+                route, english = await self._english(question, done)
+            except Exception as e:
+                for lang in todo:
+                    self._write(out, make_record(question, lang, None, error=str(e)))
+                return
+            if "en" in todo:
+                self._write(out, make_record(question, "en", route, english, time.perf_counter() - started))
+            others = [lang for lang in todo if lang != "en"]
+            results = await asyncio.gather(
+                *(self._other(question, lang, route, english) for lang in others), return_exceptions=True
+            )
+            for lang, result in zip(others, results):
+                if isinstance(result, Exception):
+                    result = make_record(question, lang, route, error=str(result))
+                self._write(out, result)
+
+    def _write(self, out, record):
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        self.written += 1
+        if record.get("error"):
+            self.errors += 1
+
+    async def run(self, questions, output):
+        done = read_checkpoint(output)
+        with open(output, "a", encoding="utf-8") as out:
+            await asyncio.gather(*(self.answer(question, done, out) for question in questions))
+        return len(done)
+
+
+def check(distinct=MAX_ENTRIES + 100):
+    """Answer `distinct` questions then a rewording of the first; True if that made no model call."""
+    from .fakes import FakeModel, FakeTranslator
+
+    model = FakeModel(first_token=0.0, chunk_delay=0.0)
+    service = ChatService(model, FakeTranslator(latency=0.0), AnswerCache(max_entries=sys.maxsize),
+                          limiter=TokenBucket(1e9))
+    questions = [f"Which temples should I visit near Tirupati on day {i}?" for i in range(distinct)]
+    # Same cache key as the first question, so it should never reach the model
+    questions.append("which TEMPLES should i visit near tirupati on day 0")
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(BatchRunner(service, ("en",)).run(questions, Path(tmp) / "answers.jsonl"))
+    ok = model.calls == distinct
+    print(f"{distinct} distinct questions and one rewording: {model.calls} model calls "
+          f"({'ok' if ok else 'the rewording missed the batch cache'})")
+    return ok
+
+
+def main(argv):
+    if argv[:1] == ["check"]:
+        return 0 if check() else 1
+    parser = argparse.ArgumentParser(prog="python -m saanchari.batch", description=__doc__.split("\n")[0])
+    parser.add_argument("questions")
+    parser.add_argument("output")
+    parser.add_argument("--langs", default=",".join(LANGUAGES))
+    parser.add_argument("--concurrency", type=int, default=16, help="questions in flight at once")
+    parser.add_argument("--rate", type=float, default=2.0, help="upstream calls per second")
+    parser.add_argument("--burst", type=float, default=None, help="calls allowed back to back")
+    parser.add_argument("--fake", action="store_true", help="use the fake model and translator")
+    args = parser.parse_args(argv)
+
+    model = translator = None
+    if args.fake:
+        from .fakes import FakeModel, FakeTranslator
+
+        model, translator = FakeModel(), FakeTranslator()
+    service = ChatService(model, translator, AnswerCache(max_entries=sys.maxsize),
+                          limiter=TokenBucket(args.rate, args.burst))
+    langs = tuple(lang for lang in args.langs.split(",") if lang in LANGUAGES)
+    runner = BatchRunner(service, langs, args.concurrency)
+    questions = read_questions(args.questions)
+
+    started = time.perf_counter()
+    try:
+        resumed = asyncio.run(runner.run(questions, args.output))
+    except KeyboardInterrupt:
+        print(f"interrupted after {runner.written} records; rerun the same command to resume")
+        return 130
+    elapsed = time.perf_counter() - started
+    print(f"{len(questions)} questions x {len(langs)} languages: {resumed} already done, "
+          f"{runner.written} written ({runner.errors} errors) in {elapsed:.1f}s "
+          f"({runner.written / max(elapsed, 1e-9):.1f} records/s)")
+    return 1 if runner.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,101 @@
+"""Process-wide cache of finished answers, shared by every session."""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from . import metrics
+from .normalize import normalize
+
+# Cached answers are served for this long before they are considered stale
+DEFAULT_TTL = 24 * 3600
+MAX_ENTRIES = 2000
+
+# Where a cached answer came from; refresh-ahead only regenerates MODEL answers
+MODEL = "model"
+PASSAGE = "kb"
+PLANNED = "planned"
+PREFETCHED = "prefetched"
+
+
+def cache_key(question):
+    """Stable key for a question across case, punctuation, scripts and spellings."""
+    return normalize(question)
+
+
+class CacheEntry:
+    __slots__ = ("text", "created", "expires", "hits", "question", "source")
+
+    def __init__(self, text, ttl, question=None, source=None):
+        self.text = text
+        # One wording of the question, so the answer can be regenerated
+        self.question = question
+        self.source = source
+        self.created = time.time()
+        self.expires = self.created + ttl
+        self.hits = 0
+
+
+class AnswerCache:
+    """LRU + TTL map from (question key, language) to answer text."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, question, lang):
+        key = (cache_key(question), lang)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires < time.time():
+                metrics.incr("cache.miss")
+                if entry is not None:
+                    metrics.incr("cache.expired")
+                return None
+            entry.hits += 1
+            self._entries.move_to_end(key)
+        metrics.incr("cache.hit")
+        return entry.text
+
+    def entry(self, question, lang):
+        """The CacheEntry for a question, even if expired, without counting a hit or miss."""
+        with self._lock:
+            return self._entries.get((cache_key(question), lang))
+
+    def put(self, question, lang, text, ttl=None, source=None):
+        key = (cache_key(question), lang)
+        with self._lock:
+            self._entries[key] = CacheEntry(text, self.ttl if ttl is None else ttl, question, source)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.incr("cache.evicted")
+
+    def entries(self):
+        """[((question key, language), CacheEntry)] for every entry, expired ones included."""
+        with self._lock:
+            return list(self._entries.items())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def load(self, path, ttl=None):
+        """Add answers from a JSONL file of {"question", "lang", "text"} records, e.g. batch output."""
+        loaded = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("text") and not record.get("error") and record.get("cacheable", True):
+                    source = {"llm": MODEL, "kb": PASSAGE}.get(record.get("route"))
+                    self.put(record["question"], record["lang"], record["text"], ttl, source)
+                    loaded += 1
+        return loaded
+
+    def __len__(self):
+        return len(self._entries)
+
+
+answers = AnswerCache()
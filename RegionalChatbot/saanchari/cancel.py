@@ -0,0 +1,48 @@
+"""Cooperative cancellation for in-flight answers."""
+import threading
+import time
+
+
+class GenerationCancelled(Exception):
+    """Raised when an answer is abandoned before it finished."""
+
+    def __init__(self, stage, reason="cancelled"):
+        super().__init__(f"generation cancelled during {stage} ({reason})")
+        self.stage = stage
+        self.reason = reason
+
+
+class CancelToken:
+    """Flag shared between the code producing an answer and whoever may abandon it.
+
+    `is_alive` is an optional probe polled alongside the flag; once it returns
+    False the token cancels itself, which is how a closed tab or a newer rerun
+    is noticed while a blocking call is still in flight.
+    """
+
+    def __init__(self, is_alive=None):
+        self._event = threading.Event()
+        self._is_alive = is_alive
+        self.reason = None
+        self.started = time.monotonic()
+
+    def cancel(self, reason="cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        if self._event.is_set():
+            return True
+        if self._is_alive is not None and not self._is_alive():
+            self.cancel("disconnected")
+            return True
+        return False
+
+    def raise_if_cancelled(self, stage):
+        if self.cancelled:
+            raise GenerationCancelled(stage, self.reason)
+
+    def elapsed(self):
+        return time.monotonic() - self.started
@@ -0,0 +1,411 @@
+"""Record and replay model and translator calls for repeatable offline runs.
+
+    SAANCHARI_CASSETTE=run.cassette SAANCHARI_CASSETTE_MODE=record streamlit run app.py
+    SAANCHARI_CASSETTE=run.cassette SAANCHARI_CASSETTE_MODE=replay streamlit run saanchari_final.py
+
+Recording keeps every upstream answer and the time each chunk took to arrive.
+Replay serves them back with those delays, scaled by SAANCHARI_CASSETTE_LATENCY
+(1 = as recorded, 0 = instant), and needs neither network nor API key. Requests
+are matched on a hash of the prompt, or of the translation text and languages;
+repeated requests replay their recordings in order. The model name is left out
+of the key because ModelRouter picks models by observed latency, which replay
+timing changes.
+
+A cassette is gzip-compressed JSON lines, one per call:
+    {"kind": "model"|"translate", "key": "<hash>", "chunks": [[delay, text], ...]}
+Each record is flushed as it is written, so a recording cut short by a crash
+still replays up to its last complete call.
+
+    python -m saanchari.cassette info run.cassette
+    python -m saanchari.cassette check
+    python -m saanchari.cassette bench
+"""
+import asyncio
+import atexit
+import gzip
+import hashlib
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import defaultdict
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+class CassetteMiss(KeyError):
+    """Replay found no recording for a request."""
+
+
+def request_key(*parts):
+    return hashlib.sha256("\x1f".join(map(str, parts)).encode()).hexdigest()[:20]
+
+
+def _model_key(prompt):
+    return request_key(prompt)
+
+
+class Cassette:
+    def __init__(self, path, mode=REPLAY, latency_scale=1.0):
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._records = defaultdict(list)
+        self._cursor = defaultdict(int)
+        self._file = None
+        if mode == REPLAY:
+            for record in self.read(path):
+                self._records[record["kind"], record["key"]].append(record["chunks"])
+        else:
+            # One compressed stream per recording session keeps records sharing a dictionary
+            self._file = gzip.open(path, "ab")
+            atexit.register(self.close)
+
+    @staticmethod
+    def read(path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    if line.endswith("\n"):
+                        yield json.loads(line)
+            except EOFError:
+                pass  # the recording process did not close the file
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __len__(self):
+        return sum(len(chunks) for chunks in self._records.values())
+
+    def add(self, kind, key, chunks):
+        record = {"kind": kind, "key": key, "chunks": [[round(d, 3), text] for d, text in chunks]}
+        data = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+        with self._lock:
+            self._file.write(data)
+            self._file.flush(zlib.Z_SYNC_FLUSH)
+
+    def take(self, kind, key):
+        """Next recording for a request, with delays scaled; the last one repeats once used up."""
+        with self._lock:
+            recordings = self._records.get((kind, key))
+            if not recordings:
+                raise CassetteMiss(f"no recorded {kind} call for key {key}")
+            index = min(self._cursor[kind, key], len(recordings) - 1)
+            self._cursor[kind, key] += 1
+        return [(delay * self.latency_scale, text) for delay, text in recordings[index]]
+
+
+class _Recorder:
+    """Collects (delay since previous chunk, text) pairs for one call."""
+
+    def __init__(self):
+        self.chunks = []
+        self._last = time.perf_counter()
+
+    def add(self, text):
+        now = time.perf_counter()
+        self.chunks.append((now - self._last, text))
+        self._last = now
+
+
+class Response:
+    """Minimal stand-in for a google-generativeai response or stream chunk."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+
+def _chunk_text(chunk):
+    try:
+        return chunk.text
+    except ValueError:
+        return None
+
+
+class RecordingModel:
+    """Pass calls through to `model`, recording what comes back."""
+
+    def __init__(self, model, cassette):
+        self._model = model
+        self._cassette = cassette
+        self.model_name = getattr(model, "model_name", "model")
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        recorder = _Recorder()
+        response = self._model.generate_content(prompt, stream=stream, **kwargs)
+        if not stream:
+            recorder.add(response.text)
+            self._cassette.add("model", _model_key(prompt), recorder.chunks)
+            return response
+
+        def chunks():
+            for chunk in response:
+                text = _chunk_text(chunk)
+                if text is not None:
+                    recorder.add(text)
+                yield chunk
+            self._cassette.add("model", _model_key(prompt), recorder.chunks)
+
+        return chunks()
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        recorder = _Recorder()
+        response = await self._model.generate_content_async(prompt, stream=stream, **kwargs)
+        if not stream:
+            recorder.add(response.text)
+            self._cassette.add("model", _model_key(prompt), recorder.chunks)
+            return response
+
+        async def chunks():
+            async for chunk in response:
+                text = _chunk_text(chunk)
+                if text is not None:
+                    recorder.add(text)
+                yield chunk
+            self._cassette.add("model", _model_key(prompt), recorder.chunks)
+
+        return chunks()
+
+
+class ReplayModel:
+    """Serve recorded answers with their recorded timing; no network, no API key."""
+
+    def __init__(self, cassette, model_name="model"):
+        self._cassette = cassette
+        self.model_name = model_name
+
+    def _take(self, prompt):
+        return self._cassette.take("model", _model_key(prompt))
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        chunks = self._take(prompt)
+        if not stream:
+            time.sleep(sum(delay for delay, _ in chunks))
+            return Response("".join(text for _, text in chunks))
+
+        def replay():
+            for delay, text in chunks:
+                time.sleep(delay)
+                yield Response(text)
+
+        return replay()
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        chunks = self._take(prompt)
+        if not stream:
+            await asyncio.sleep(sum(delay for delay, _ in chunks))
+            return Response("".join(text for _, text in chunks))
+
+        async def replay():
+            for delay, text in chunks:
+                await asyncio.sleep(delay)
+                yield Response(text)
+
+        return replay()
+
+
+def _translate_key(text, dest, src):
+    return request_key(text, dest, src)
+
+
+class RecordingTranslator:
+    """Wrap a googletrans Translator (sync or async API) and record its results."""
+
+    def __init__(self, translator, cassette):
+        self._translator = translator
+        self._cassette = cassette
+
+    def translate(self, text, dest="en", src="auto", **kwargs):
+        recorder = _Recorder()
+        result = self._translator.translate(text, dest=dest, src=src, **kwargs)
+
+        def record(result):
+            recorder.add(result.text)
+            self._cassette.add("translate", _translate_key(text, dest, src), recorder.chunks)
+            return result
+
+        if inspect.isawaitable(result):
+            async def finish():
+                return record(await result)
+
+            return finish()
+        return record(result)
+
+
+class ReplayTranslator:
+    """Serve recorded translations; async like the installed googletrans unless told otherwise."""
+
+    def __init__(self, cassette, asynchronous=None):
+        self._cassette = cassette
+        if asynchronous is None:
+            from googletrans import Translator
+
+            asynchronous = inspect.iscoroutinefunction(Translator.translate)
+        self.asynchronous = asynchronous
+
+    def translate(self, text, dest="en", src="auto", **kwargs):
+        (delay, translated), = self._cassette.take("translate", _translate_key(text, dest, src))
+        if not self.asynchronous:
+            time.sleep(delay)
+            return Response(translated)
+
+        async def replay():
+            await asyncio.sleep(delay)
+            return Response(translated)
+
+        return replay()
+
+
+_active = None
+_active_lock = threading.Lock()
+
+
+def active():
+    """The process-wide cassette named by SAANCHARI_CASSETTE, or None."""
+    global _active
+    path = os.getenv("SAANCHARI_CASSETTE")
+    if not path:
+        return None
+    with _active_lock:
+        if _active is None:
+            mode = os.getenv("SAANCHARI_CASSETTE_MODE", REPLAY)
+            scale = float(os.getenv("SAANCHARI_CASSETTE_LATENCY", "1"))
+            _active = Cassette(path, mode, scale)
+        return _active
+
+
+def replaying():
+    cassette = active()
+    return cassette is not None and cassette.mode == REPLAY
+
+
+def wrap_model(model, model_name="gemini-1.5-flash", cassette=None):
+    """`model` wrapped for `cassette` (default: the active one); in replay `model` may be None."""
+    if cassette is None:
+        cassette = active()
+    if cassette is None:
+        return model
+    if cassette.mode == RECORD:
+        return RecordingModel(model, cassette)
+    return ReplayModel(cassette, getattr(model, "model_name", model_name))
+
+
+def wrap_translator(translator, cassette=None):
+    if cassette is None:
+        cassette = active()
+    if cassette is None:
+        return translator
+    if cassette.mode == RECORD:
+        return RecordingTranslator(translator, cassette)
+    return ReplayTranslator(cassette)
+
+
+def info(path):
+    records = list(Cassette.read(path))
+    size = os.path.getsize(path)
+    raw = sum(len(json.dumps(r, ensure_ascii=False).encode()) for r in records)
+    by_kind = defaultdict(list)
+    for record in records:
+        by_kind[record["kind"]].append(sum(delay for delay, _ in record["chunks"]))
+    print(f"{path}: {len(records)} calls, {size / 1024:.1f} KiB on disk ({raw / max(size, 1):.1f}x smaller than JSON)")
+    for kind, latencies in sorted(by_kind.items()):
+        latencies.sort()
+        print(f"  {kind:<10} {len(latencies):>5} calls  p50 {latencies[len(latencies) // 2] * 1000:.0f} ms  "
+              f"max {latencies[-1] * 1000:.0f} ms")
+
+
+async def _session(model, translator, questions):
+    from . import engine
+    from .cancel import CancelToken
+    from .prompts import build_prompt
+
+    replies = []
+    for question in questions:
+        reply = await engine.generate_reply(model, build_prompt(question), CancelToken())
+        replies.append(await engine.translate_text(reply, "te", src="en", translator=translator))
+    return replies
+
+
+def check():
+    """Record through wrap_model() as app.py does with an API key, then replay key-less with wrap_model(None).
+
+    The replay also runs as a different model, as ModelRouter may pick one under replay timing.
+    """
+    import tempfile
+
+    from . import kb
+    from .fakes import FakeModel, FakeTranslator
+
+    questions = kb.SAMPLE_QUERIES[:4]
+    cases = (("gemini-1.5-flash", "gemini-1.5-flash"), ("gemini-1.5-flash", "gemini-1.5-flash-8b"))
+    failures = 0
+    for recorded_as, replayed_as in cases:
+        path = os.path.join(tempfile.mkdtemp(), "check.cassette")
+        recorder = Cassette(path, RECORD)
+        # genai names its models "models/<name>"
+        live = FakeModel(first_token=0, chunk_delay=0, model_name=f"models/{recorded_as}",
+                         answer=f"{recorded_as} answer")
+        recorded = asyncio.run(_session(wrap_model(live, cassette=recorder),
+                                        wrap_translator(FakeTranslator(latency=0), recorder), questions))
+        recorder.close()
+        player = Cassette(path, REPLAY, latency_scale=0)
+        try:
+            replayed = asyncio.run(_session(wrap_model(None, replayed_as, cassette=player),
+                                            ReplayTranslator(player, asynchronous=True), questions))
+        except CassetteMiss as e:
+            replayed = e
+        ok = replayed == recorded
+        failures += not ok
+        print(f"  {recorded_as} -> {replayed_as:<20} record -> replay: {'ok' if ok else f'FAILED ({replayed!r})'}")
+    print(f"{len(cases) - failures}/{len(cases)} replays match what was recorded")
+    return not failures
+
+
+def bench():
+    import tempfile
+
+    from . import kb
+    from .fakes import FakeModel, FakeTranslator
+
+    questions = kb.SAMPLE_QUERIES
+    path = os.path.join(tempfile.mkdtemp(), "bench.cassette")
+    recorder = Cassette(path, RECORD)
+    started = time.perf_counter()
+    live = asyncio.run(_session(RecordingModel(FakeModel(first_token=0.05, chunk_delay=0.005), recorder),
+                                RecordingTranslator(FakeTranslator(latency=0.02), recorder), questions))
+    recorded = time.perf_counter() - started
+    recorder.close()
+    print(f"recorded {len(questions)} questions in {recorded:.2f}s")
+    info(path)
+    for scale in (1.0, 0.5, 0.0):
+        cassette = Cassette(path, REPLAY, scale)
+        started = time.perf_counter()
+        replayed = asyncio.run(_session(ReplayModel(cassette, "fake-gemini"),
+                                        ReplayTranslator(cassette, asynchronous=True), questions))
+        elapsed = time.perf_counter() - started
+        print(f"replay x{scale}: {elapsed:.2f}s ({elapsed / recorded:.2f} of recorded), "
+              f"identical answers: {replayed == live}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["info"]:
+        info(sys.argv[2])
+    elif sys.argv[1:2] == ["check"]:
+        sys.exit(0 if check() else 1)
+    elif sys.argv[1:2] == ["bench"]:
+        bench()
+    else:
+        print(__doc__)
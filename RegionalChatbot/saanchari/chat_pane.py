@@ -0,0 +1,163 @@
+"""Chat transcript component that keeps the message DOM in the browser.
+
+The server never re-sends the transcript. Each render carries only the events
+produced since the previous render (new message, streamed text, finalized
+message), and the browser applies them to the DOM it already holds.
+"""
+import json
+from pathlib import Path
+
+import streamlit.components.v1 as components
+
+from . import metrics
+from .history import PAGE_SIZE, first_index, visible_window
+from .markdown import StreamingRenderer
+
+_component = components.declare_component(
+    "saanchari_chat_pane",
+    path=str(Path(__file__).parent / "frontend" / "chat_pane"),
+)
+
+FRAME_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BYTE_BUCKETS = (1e3, 5e3, 1e4, 5e4, 1e5, 5e5, 1e6)
+
+
+class ChatPane:
+    """Server-side view of what the browser pane currently shows.
+
+    `sync()` diffs the session transcript and the in-flight reply against that
+    view and queues the append/delta/finalize events needed to catch the
+    browser up. Events are numbered so the browser can spot a gap and ask
+    for a fresh snapshot.
+    """
+
+    def __init__(self, page_size=PAGE_SIZE):
+        self.page_size = page_size
+        self.instance = None
+        self.loads_seen = 0
+        self.resyncs_seen = 0
+        self._seq = 0
+        self._events = []
+        self._sent = 0
+        self._first_shown = 0
+        self._stream_id = None
+        self._stream_len = 0
+        self._stream_typing = False
+        self._renderer = None
+        self._answer_frames = 0
+        self._answer_bytes = 0
+        self._answer_done = False
+
+    def _emit(self, op, **fields):
+        self._seq += 1
+        fields.update(op=op, seq=self._seq)
+        self._events.append(fields)
+
+    def handle_client(self, value, messages, render):
+        """Apply the component's last reported state (mount, resync, load earlier)."""
+        if not value:
+            return
+        if value.get("instance") != self.instance or value.get("resync", 0) != self.resyncs_seen:
+            self.instance = value.get("instance")
+            self.resyncs_seen = value.get("resync", 0)
+            self.loads_seen = value.get("load_earlier", 0)
+            self.reset(messages, render)
+        elif value.get("load_earlier", 0) != self.loads_seen:
+            self.loads_seen = value.get("load_earlier", 0)
+            self.load_earlier(messages, render)
+
+    def reset(self, messages, render):
+        """Replace whatever the browser shows with the newest page of `messages`."""
+        self._events = []
+        hidden, visible = visible_window(messages, 1, self.page_size)
+        self._emit(
+            "reset",
+            hidden=hidden - first_index(messages),
+            messages=[
+                {"id": f"m{hidden + i}", "html": render(m["role"], m["content"])}
+                for i, m in enumerate(visible)
+            ],
+        )
+        self._sent = len(messages)
+        self._first_shown = hidden
+        self._stream_id = None
+        self._stream_len = 0
+
+    def load_earlier(self, messages, render):
+        start = max(first_index(messages), self._first_shown - self.page_size)
+        older = messages[start:self._first_shown]
+        self._emit(
+            "prepend",
+            hidden=start - first_index(messages),
+            messages=[
+                {"id": f"m{start + i}", "html": render(m["role"], m["content"])}
+                for i, m in enumerate(older)
+            ],
+        )
+        self._first_shown = start
+
+    def sync(self, messages, render, status=None, text="", typing_html="", stream_shell=""):
+        """Queue events that bring the browser up to date with `messages` and the live reply.
+
+        `status`/`text` describe the reply in flight (None when idle); a
+        `status` of "thinking" shows `typing_html` until text arrives, after
+        which the message becomes `stream_shell` and grows by deltas. Each
+        delta carries the markdown ops for the lines it completed plus a
+        preview of the unfinished line, never the text received earlier.
+        """
+        for index in range(self._sent, len(messages)):
+            message = messages[index]
+            html = render(message["role"], message["content"])
+            message_id = f"m{index}"
+            if message_id == self._stream_id:
+                self._emit("finalize", id=message_id, html=html)
+                self._stream_id = None
+                self._answer_done = True
+            else:
+                self._emit("append", id=message_id, html=html)
+        self._sent = len(messages)
+
+        stream_id = f"m{len(messages)}"
+        if status is None:
+            if self._stream_id is not None:
+                self._emit("remove", id=self._stream_id)
+                self._stream_id = None
+                self._answer_done = True
+        else:
+            if self._stream_id != stream_id:
+                if self._stream_id is not None:
+                    self._emit("remove", id=self._stream_id)
+                self._emit("append", id=stream_id, html=typing_html)
+                self._stream_id = stream_id
+                self._stream_len = 0
+                self._stream_typing = True
+            if text:
+                if self._stream_typing:
+                    self._emit("patch", id=stream_id, html=stream_shell)
+                    self._stream_typing = False
+                    self._renderer = StreamingRenderer()
+                if len(text) > self._stream_len:
+                    ops = self._renderer.feed(text[self._stream_len:])
+                    self._emit("delta", id=stream_id, ops=ops, tail=self._renderer.tail())
+                    self._stream_len = len(text)
+
+    def drain(self):
+        """Hand over queued events, counting frames and bytes sent for the current answer."""
+        events, self._events = self._events, []
+        if events:
+            self._answer_frames += 1
+            self._answer_bytes += len(json.dumps(events, ensure_ascii=False).encode())
+        if self._answer_done:
+            metrics.incr("stream.answers")
+            metrics.observe("stream.frames_per_answer", self._answer_frames, buckets=FRAME_BUCKETS)
+            metrics.observe("stream.bytes_per_answer", self._answer_bytes, buckets=BYTE_BUCKETS)
+            self._answer_frames = 0
+            self._answer_bytes = 0
+            self._answer_done = False
+        return events
+
+
+def chat_pane(pane, key="chat_pane"):
+    """Render the component, sending only the events queued on `pane`."""
+    return _component(events=pane.drain(), key=key, default=None)
+
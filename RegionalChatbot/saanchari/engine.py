@@ -0,0 +1,118 @@
+"""Model and translation calls that can be abandoned mid-flight."""
+import asyncio
+import concurrent.futures
+import inspect
+import threading
+
+from googletrans import Translator
+
+from . import metrics
+from .cancel import GenerationCancelled
+from .cassette import wrap_translator
+from .usage import Usage
+
+# How often a waiting caller re-checks its cancel token
+POLL_INTERVAL = 0.05
+
+_loop = None
+_loop_lock = threading.Lock()
+_translator = None
+
+
+def get_loop():
+    """Return the background event loop that owns every upstream connection."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="saanchari-io", daemon=True).start()
+        return _loop
+
+
+def run_cancellable(coro, token, stage):
+    """Run `coro` on the background loop, aborting the upstream call once `token` is cancelled."""
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    while True:
+        try:
+            return future.result(timeout=POLL_INTERVAL)
+        except TimeoutError:
+            if token.cancelled:
+                future.cancel()
+                raise GenerationCancelled(stage, token.reason)
+        except concurrent.futures.CancelledError:
+            # The coroutine was cancelled on the loop (e.g. by a shared task owner)
+            raise GenerationCancelled(stage, token.reason or "cancelled")
+
+
+async def stream_reply(model, prompt, token, on_usage=None, generation_config=None):
+    """Yield the model answer piece by piece, checking for cancellation between chunks.
+
+    `on_usage` is called with the call's Usage when the stream ends, is
+    cancelled or fails; tokens already generated are paid for either way.
+    """
+    kwargs = {"generation_config": generation_config} if generation_config else {}
+    parts = []
+    metadata = None
+    try:
+        response = await model.generate_content_async(prompt, stream=True, **kwargs)
+        async for chunk in response:
+            token.raise_if_cancelled("generate")
+            metadata = getattr(chunk, "usage_metadata", None) or metadata
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety metadata only)
+                continue
+            parts.append(text)
+            yield text
+    finally:
+        if on_usage is not None:
+            on_usage(Usage.from_metadata(metadata, prompt, "".join(parts)))
+
+
+async def generate_reply(model, prompt, token, on_chunk=None, on_usage=None, generation_config=None):
+    """Stream the model answer, checking for cancellation between chunks.
+
+    `on_chunk` is called with each piece of text as it arrives.
+    """
+    return await collect(stream_reply(model, prompt, token, on_usage, generation_config), on_chunk)
+
+
+async def collect(chunks, on_chunk=None):
+    """Join an async stream of text, passing each piece to `on_chunk` as it arrives."""
+    parts = []
+    async for text in chunks:
+        parts.append(text)
+        if on_chunk is not None:
+            on_chunk(text)
+    return "".join(parts).strip()
+
+
+async def translate_text(text, dest, src="auto", translator=None):
+    """Translate `text` into language code `dest`; a known `src` skips remote detection.
+
+    Without `translator` the shared one owned by the background loop is used.
+    """
+    global _translator
+    if translator is None:
+        if _translator is None:
+            _translator = wrap_translator(Translator())
+        translator = _translator
+    result = translator.translate(text, dest=dest, src=src)
+    if inspect.isawaitable(result):
+        result = await result
+    return result.text
+
+
+def record_completed(token):
+    metrics.incr("generation.completed")
+    metrics.observe("generation.seconds", token.elapsed())
+
+
+def record_cancelled(token, stage, discarded_chars=0):
+    """Count abandoned work so cancellation savings show up in metrics."""
+    metrics.incr("generation.cancelled")
+    metrics.incr(f"generation.cancelled.{stage}")
+    metrics.incr(f"generation.cancelled.reason.{token.reason or 'cancelled'}")
+    metrics.incr("generation.cancelled.discarded_chars", discarded_chars)
+    metrics.observe("generation.cancelled_after_seconds", token.elapsed())
@@ -0,0 +1,77 @@
+"""Stand-in Gemini model and translator with configurable latency, for benchmarks.
+
+They mimic the parts of google-generativeai and googletrans the engine uses:
+`generate_content_async(prompt, stream=True)` yielding chunks with `.text`, and
+an async `translate(text, dest, src)` returning an object with `.text`.
+"""
+import asyncio
+import random
+
+SAMPLE_ANSWER = (
+    "### Highlights\n\n"
+    "* **Tirupati**: the Sri Venkateswara temple on the Tirumala hills\n"
+    "* **Araku Valley**: coffee estates, Borra Caves and the Vistadome train\n"
+    "* **Visakhapatnam**: RK Beach, Kailasagiri and the submarine museum\n"
+    "* **Food**: try **Pootharekulu**, **Gongura** pickle and **Pesarattu**\n"
+)
+
+
+class Chunk:
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeUpstreamError(RuntimeError):
+    pass
+
+
+class FakeModel:
+    """Streams `answer` word by word after `first_token` seconds, `chunk_delay` apart.
+
+    A share `error_rate` of calls fail with FakeUpstreamError after the first-token delay.
+    """
+
+    def __init__(self, answer=SAMPLE_ANSWER, first_token=0.3, chunk_delay=0.02, words_per_chunk=4,
+                 model_name="fake-gemini", error_rate=0.0, seed=0):
+        self.answer = answer
+        self.first_token = first_token
+        self.chunk_delay = chunk_delay
+        self.words_per_chunk = words_per_chunk
+        self.model_name = model_name
+        self.error_rate = error_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    def _chunks(self):
+        words = self.answer.split(" ")
+        for i in range(0, len(words), self.words_per_chunk):
+            yield " ".join(words[i:i + self.words_per_chunk]) + " "
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.first_token)
+        if self._random.random() < self.error_rate:
+            raise FakeUpstreamError(f"{self.model_name} is unavailable")
+
+        async def stream_chunks():
+            for i, text in enumerate(self._chunks()):
+                if i:
+                    await asyncio.sleep(self.chunk_delay)
+                yield Chunk(text)
+
+        return stream_chunks()
+
+
+class FakeTranslator:
+    """Tags text with the target language after `latency` seconds."""
+
+    def __init__(self, latency=0.15):
+        self.latency = latency
+        self.calls = 0
+
+    async def translate(self, text, dest="en", src="auto"):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return Chunk(f"[{dest}] {text}")
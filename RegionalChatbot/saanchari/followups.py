@@ -0,0 +1,394 @@
+"""Follow-up question suggestions, with their answers prefetched in the background.
+
+After an answer about a place, the next question is usually predictable:
+how to get there, when to go, what to eat nearby. suggest() turns the place
+into two or three such questions in the answer's language, and a Prefetcher
+answers the likeliest of them ahead of the click and stores them in the
+answer cache, so a clicked suggestion is served like any cached answer.
+
+Prefetching spends tokens on questions that may never be asked, so it runs
+under a strict budget: a process-wide rate and in-flight limit, a daily
+token allowance, only for sessions on the full answer plan, and never for
+answers already cached. Suggestions left unclicked cancel their prefetch.
+A clicked suggestion whose prefetch fails or is cancelled is answered live.
+
+    python -m saanchari.followups "Tell me about Araku Valley"
+    python -m saanchari.followups bench
+    python -m saanchari.followups check
+"""
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+from . import engine, gazetteer, kb, metrics
+from .cache import MODEL, PREFETCHED, cache_key
+from .cancel import CancelToken
+from .planner import TOPIC_WORDS
+from .prompts import build_prompt
+from .ratelimit import BACKGROUND_HEADROOM, TokenBucket, upstream
+from .usage import FULL, ledger as default_ledger, today
+
+MAX_SUGGESTIONS = 3
+
+# Prefetches per answer, process-wide starts per second, concurrent prefetches and daily tokens
+PER_ANSWER = int(os.getenv("SAANCHARI_PREFETCH_PER_ANSWER", "1"))
+PREFETCH_RATE = float(os.getenv("SAANCHARI_PREFETCH_RATE", "0.5"))
+PREFETCH_BURST = 4
+MAX_IN_FLIGHT = 4
+DAILY_TOKEN_BUDGET = int(os.getenv("SAANCHARI_PREFETCH_TOKEN_BUDGET", "200000"))
+
+SUBJECT_KINDS = ("place", "temple")
+
+TIMING_WORDS = frozenset("timings timing hours open opening close closing when time season month ఎప్పుడు సమయం कब समय".split())
+
+# (topic, {lang: question}); the English question is the one prefetched and answered
+FOLLOW_UPS = [
+    ("Transport", {
+        "en": "How do I get to {place}?",
+        "te": "{place}కి ఎలా చేరుకోవాలి?",
+        "hi": "{place} कैसे पहुँचें?",
+    }),
+    ("Timings", {
+        "en": "What are the timings and best time to visit {place}?",
+        "te": "{place} సందర్శన సమయాలు మరియు సరైన సమయం ఏమిటి?",
+        "hi": "{place} घूमने का समय और सबसे अच्छा मौसम क्या है?",
+    }),
+    ("Food", {
+        "en": "What food can I try near {place}?",
+        "te": "{place} దగ్గర ఏ ఆహారం తినవచ్చు?",
+        "hi": "{place} के पास क्या खाना खा सकते हैं?",
+    }),
+    ("Hotels", {
+        "en": "Where should I stay near {place}?",
+        "te": "{place} దగ్గర ఎక్కడ బస చేయాలి?",
+        "hi": "{place} के पास कहाँ ठहरें?",
+    }),
+]
+
+# Prefetch states
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Suggestion:
+    __slots__ = ("label", "question", "lang")
+
+    def __init__(self, label, question, lang="en"):
+        self.label = label
+        self.question = question
+        self.lang = lang
+
+    def __repr__(self):
+        return f"Suggestion({self.label!r}, {self.question!r})"
+
+
+def _subject(question, answer, lang):
+    """(canonical, display name) of the place the conversation is about, else None."""
+    for text in (question, answer):
+        for entity in gazetteer.extract(text or ""):
+            if entity.kind in SUBJECT_KINDS:
+                # Keep the name as the user wrote it when it is in their script
+                native = lang != "en" and not entity.surface.isascii() and text is question
+                return entity.canonical, entity.surface if native else entity.canonical
+    return None
+
+
+def suggest(question, answer="", lang="en", limit=MAX_SUGGESTIONS):
+    """Likely next questions about the place in `question` (or else `answer`), skipping what was asked."""
+    subject = _subject(question, answer, lang)
+    if subject is None:
+        return []
+    canonical, name = subject
+    words = kb.words(question)
+    asked = {TOPIC_WORDS[w] for w in words if w in TOPIC_WORDS}
+    if TIMING_WORDS.intersection(words):
+        asked.add("Timings")
+    suggestions = []
+    for topic, templates in FOLLOW_UPS:
+        if topic in asked:
+            continue
+        english = templates["en"].format(place=canonical)
+        label = templates.get(lang, templates["en"]).format(place=name)
+        if cache_key(label) == cache_key(question):
+            continue
+        suggestions.append(Suggestion(label, english, lang))
+        if len(suggestions) == limit:
+            break
+    return suggestions
+
+
+class Prefetch:
+    """One suggestion being answered ahead of the click."""
+
+    __slots__ = ("suggestion", "key", "state", "token", "future", "tokens")
+
+    def __init__(self, suggestion):
+        self.suggestion = suggestion
+        self.key = (cache_key(suggestion.label), suggestion.lang)
+        self.state = PENDING
+        self.token = CancelToken()
+        self.future = None
+        self.tokens = 0
+
+    def cancel(self):
+        self.token.cancel("superseded")
+        if self.future is not None:
+            self.future.cancel()
+
+    async def join(self, token=None, fallback=None):
+        """GenerationJob `stream`: the English answer once the prefetch finishes.
+
+        If the prefetch fails or is cancelled, `fallback(token)`, an async
+        iterator of text, answers the question live instead.
+        """
+        try:
+            text = await asyncio.shield(asyncio.wrap_future(self.future))
+        except BaseException:
+            # Only the prefetch's own outcome falls back; a cancelled join is not retried
+            if fallback is None or not self.future.done():
+                raise
+            metrics.incr("prefetch.fallback")
+            async for text in fallback(token):
+                yield text
+            return
+        yield text
+
+
+class Prefetcher:
+    """Answers offered suggestions into `cache` on the engine's background loop.
+
+    Each session has one open offer, the suggestions under its latest answer.
+    claim() settles it when the session asks its next question: a suggestion
+    answered in time is a hit, one still running is joined, and the rest are
+    wasted (finished) or cancelled (still running).
+    """
+
+    def __init__(self, models, cache, ledger=default_ledger, rate=PREFETCH_RATE, burst=PREFETCH_BURST,
+                 max_in_flight=MAX_IN_FLIGHT, per_answer=PER_ANSWER, daily_tokens=DAILY_TOKEN_BUDGET):
+        self.models = models
+        self.cache = cache
+        self.ledger = ledger
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.max_in_flight = max_in_flight
+        self.per_answer = per_answer
+        self.daily_tokens = daily_tokens
+        self._lock = threading.Lock()
+        self._offers = {}
+        self._in_flight = {}
+
+    def _skip(self, reason):
+        metrics.incr(f"prefetch.skipped.{reason}")
+
+    def offer(self, session, suggestions, loop=None):
+        """Record `suggestions` as the session's open offer and start prefetching the first few."""
+        self.claim(session, None, None)
+        offer = []
+        budget_session = f"prefetch-{today()}"
+        for i, suggestion in enumerate(suggestions):
+            entry = None
+            if self.bucket is None:
+                self._skip("disabled")
+            elif i >= self.per_answer:
+                self._skip("per_answer")
+            elif self.cache.get(suggestion.label, suggestion.lang) is not None:
+                self._skip("cached")
+            elif self.ledger.plan(session) != FULL or self.ledger.session(budget_session)[0] >= self.daily_tokens:
+                self._skip("budget")
+            else:
+                entry = self._start(suggestion, budget_session, loop or engine.get_loop())
+            offer.append((suggestion, entry))
+        metrics.incr("followups.offered", len(suggestions))
+        with self._lock:
+            self._offers[session] = offer
+
+    def _start(self, suggestion, budget_session, loop):
+        entry = Prefetch(suggestion)
+        with self._lock:
+            if entry.key in self._in_flight:
+                self._skip("duplicate")
+                return None
+            if len(self._in_flight) >= self.max_in_flight:
+                self._skip("busy")
+                return None
+            if not self.bucket.try_acquire():
+                self._skip("rate")
+                return None
+            if not upstream.try_acquire(keep=BACKGROUND_HEADROOM):
+                self._skip("upstream")
+                return None
+            self._in_flight[entry.key] = entry
+        metrics.incr("prefetch.started")
+        entry.future = asyncio.run_coroutine_threadsafe(self._answer(entry, budget_session), loop)
+        return entry
+
+    async def _answer(self, entry, budget_session):
+        suggestion = entry.suggestion
+        choice = self.models.choose(suggestion.question)
+
+        def record(usage):
+            entry.tokens = usage.total
+            self.ledger.record(budget_session, "prefetch", choice.name, usage)
+
+        try:
+            english = await engine.generate_reply(
+                choice.model, build_prompt(suggestion.question), entry.token, None, record, choice.generation_config
+            )
+            self.cache.put(suggestion.question, "en", english, source=PREFETCHED)
+            text = english
+            if suggestion.lang != "en":
+                text = await engine.translate_text(english, suggestion.lang, src="en")
+            self.cache.put(suggestion.label, suggestion.lang, text, source=PREFETCHED)
+            entry.state = READY
+            metrics.incr("prefetch.completed")
+            return english
+        except BaseException:
+            entry.state = CANCELLED if entry.token.cancelled else FAILED
+            if entry.state == FAILED:
+                metrics.incr("prefetch.failed")
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(entry.key, None)
+
+    def claim(self, session, question, lang):
+        """Settle the session's open offer now that it asks `question` in `lang`.
+
+        Returns the Prefetch still answering that question, to be joined, else None.
+        """
+        with self._lock:
+            offer = self._offers.pop(session, None)
+        if not offer:
+            return None
+        key = (cache_key(question), lang) if question is not None else None
+        pending = None
+        for suggestion, entry in offer:
+            clicked = (cache_key(suggestion.label), suggestion.lang) == key
+            if clicked:
+                metrics.incr("followups.clicked")
+            if entry is None:
+                continue
+            if clicked and entry.state == READY:
+                metrics.incr("prefetch.hit")
+            elif clicked and entry.state == PENDING:
+                metrics.incr("prefetch.joined")
+                pending = entry
+            elif entry.state == READY:
+                metrics.incr("prefetch.wasted")
+                metrics.incr("prefetch.wasted_tokens", entry.tokens)
+            elif entry.state == PENDING:
+                entry.cancel()
+                metrics.incr("prefetch.cancelled")
+        return pending
+
+
+async def _bench(answers=40, click_share=0.6, seed=7):
+    """Simulated readers click a suggestion (or ask something else) a few seconds after each answer."""
+    from .cache import AnswerCache
+    from .fakes import FakeModel
+    from .models import ModelRouter
+    from .usage import UsageLedger
+
+    rand = random.Random(seed)
+    places = ["Araku Valley", "Tirupati", "Srisailam", "Gandikota", "Lambasingi", "Horsley Hills",
+              "Visakhapatnam", "Amaravati", "Lepakshi", "Kurnool"]
+    script = [(f"Tell me about {rand.choice(places)}", rand.uniform(0.3, 2.5),
+               rand.random() < click_share, rand.choice([0, 0, 1, 2])) for _ in range(answers)]
+
+    async def run(per_answer):
+        metrics.registry.reset()
+        cache = AnswerCache()
+        usage = UsageLedger()
+        router = ModelRouter(lambda name: FakeModel(first_token=0.4, chunk_delay=0.03, model_name=name))
+        prefetcher = Prefetcher(router, cache, usage, rate=2.0 if per_answer else 0, per_answer=per_answer)
+        waits = []
+        live_tokens = [0]
+
+        async def reader(i, question, think, clicks, pick):
+            session = f"s{i}"
+            await asyncio.sleep(i * 0.4)
+            suggestions = suggest(question, "", "en")
+            prefetcher.offer(session, suggestions, asyncio.get_running_loop())
+            await asyncio.sleep(think)
+            asked = suggestions[min(pick, len(suggestions) - 1)].label if clicks else f"Something else {i}"
+            started = time.perf_counter()
+            pending = prefetcher.claim(session, asked, "en")
+            if not clicks:
+                return
+            if cache.get(asked, "en") is None:
+                if pending is not None:
+                    await engine.collect(pending.join())
+                else:
+                    choice = router.choose(asked)
+                    record = lambda u: live_tokens.__setitem__(0, live_tokens[0] + u.total)
+                    text = await engine.generate_reply(choice.model, build_prompt(asked), CancelToken(), None, record)
+                    cache.put(asked, "en", text, source=MODEL)
+            waits.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(reader(i, *row) for i, row in enumerate(script)))
+        await asyncio.sleep(0.1)
+        waits.sort()
+        counters = metrics.snapshot()["counters"]
+        prefetch_tokens = sum(row[5] + row[6] for row in usage.rows())
+        return waits, counters, prefetch_tokens, live_tokens[0]
+
+    for label, per_answer in (("no prefetch", 0), ("1 per answer", 1), ("2 per answer", 2)):
+        waits, counters, prefetch_tokens, live_tokens = await run(per_answer)
+        instant = sum(1 for wait in waits if wait < 0.05)
+        print(f"{label:<12} clicks {len(waits)}, instant {instant} ({instant / len(waits):.0%}), "
+              f"wait p50 {waits[len(waits) // 2] * 1000:4.0f} ms, p95 {waits[int(len(waits) * 0.95)] * 1000:4.0f} ms")
+        if per_answer:
+            started = counters.get("prefetch.started", 0)
+            print(f"{'':<12} prefetched {started}: hit {counters.get('prefetch.hit', 0)}, "
+                  f"joined {counters.get('prefetch.joined', 0)}, wasted {counters.get('prefetch.wasted', 0)}, "
+                  f"cancelled {counters.get('prefetch.cancelled', 0)}; skipped as cached "
+                  f"{counters.get('prefetch.skipped.cached', 0)}, over rate {counters.get('prefetch.skipped.rate', 0)}")
+        print(f"{'':<12} tokens: live {live_tokens}, prefetch {prefetch_tokens} "
+              f"(wasted {counters.get('prefetch.wasted_tokens', 0)})")
+
+def check():
+    """Click a suggestion whose prefetch fails, then one whose prefetch is cancelled; True if both are answered live."""
+    from .cache import AnswerCache
+    from .fakes import FakeModel
+    from .models import ModelRouter
+    from .usage import UsageLedger
+
+    live = FakeModel(first_token=0.01, chunk_delay=0.0)
+    expected = engine.run_cancellable(engine.generate_reply(live, "", CancelToken()), CancelToken(), "generate")
+    ok = True
+    for case, error_rate in (("prefetch raises", 1.0), ("prefetch cancelled", 0.0)):
+        models = ModelRouter(lambda name: FakeModel(first_token=0.1, chunk_delay=0.0, error_rate=error_rate,
+                                                    model_name=name))
+        prefetcher = Prefetcher(models, AnswerCache(), ledger=UsageLedger())
+        suggestion = suggest("Tell me about Tirupati")[0]
+        prefetcher.offer("check", [suggestion])
+        pending = prefetcher.claim("check", suggestion.label, suggestion.lang)
+        if error_rate == 0.0:
+            pending.cancel()
+        token = CancelToken()
+
+        def fallback(token):
+            return engine.stream_reply(live, build_prompt(suggestion.question), token)
+
+        try:
+            text = engine.run_cancellable(engine.collect(pending.join(token, fallback)), token, "generate")
+        except Exception as e:
+            text = f"{type(e).__name__}: {e}"
+        passed = pending is not None and text == expected
+        ok = ok and passed
+        print(f"{case:<20} {'answered live' if passed else 'shown to the user: ' + text[:60]}")
+    return ok
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["bench"]:
+        asyncio.run(_bench())
+    elif sys.argv[1:2] == ["check"]:
+        sys.exit(0 if check() else 1)
+    else:
+        for suggestion in suggest(" ".join(sys.argv[1:])):
+            print(f"{suggestion.label:<56} {suggestion.question}")
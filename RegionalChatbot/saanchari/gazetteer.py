@@ -0,0 +1,226 @@
+"""Entity extraction over a multilingual gazetteer with an Aho-Corasick automaton.
+
+The automaton is built once from data/gazetteer.tsv (English, Telugu and Hindi
+names plus common transliterations) and finds every place, dish, festival and
+craft in a text in one left-to-right pass.
+
+    python -m saanchari.gazetteer "Best pootharekulu near Rajahmundry?"
+    python -m saanchari.gazetteer bench
+"""
+import sys
+import time
+import unicodedata
+from collections import deque, namedtuple
+
+from . import kb
+
+GAZETTEER_PATH = kb.DATA_DIR / "gazetteer.tsv"
+
+Entity = namedtuple("Entity", "canonical kind start end surface")
+
+_WORD_CATEGORIES = ("L", "M", "N")
+
+
+def _is_word_char(ch):
+    return unicodedata.category(ch)[0] in _WORD_CATEGORIES
+
+
+def fold(text):
+    """NFC + case folding, applied identically to patterns and input."""
+    return unicodedata.normalize("NFC", text).casefold()
+
+
+def fold_with_spans(text):
+    """fold(text), plus the span of `text` each folded character came from.
+
+    Folding can change the length ("ß" -> "ss", "ﬁ" -> "fi", "e" + U+0301 ->
+    "é"), so each base character and its combining marks are folded together
+    and every character they fold to maps back to that whole span. The spans
+    are None when folding keeps every offset, which is the common case.
+    """
+    if unicodedata.is_normalized("NFC", text):
+        folded = text.casefold()
+        # Case folding never shortens a character, so equal lengths mean one-to-one
+        if len(folded) == len(text):
+            return folded, None
+    parts = []
+    spans = []
+    start = 0
+    for end in range(1, len(text) + 1):
+        if end < len(text) and unicodedata.combining(text[end]):
+            continue
+        part = fold(text[start:end])
+        parts.append(part)
+        spans.extend([(start, end)] * len(part))
+        start = end
+    return "".join(parts), spans
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: build once, then scan texts in linear time."""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        self.patterns = []
+        for pattern, value in patterns:
+            self._add(pattern, value)
+        self._link()
+
+    def _add(self, pattern, value):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._out[node] += (len(self.patterns),)
+        self.patterns.append((pattern, value))
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._out[child] += self._out[self._fail[child]]
+
+    def iter(self, text):
+        """Yield (start, end, pattern index) for every occurrence of every pattern."""
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for index in out[node]:
+                yield i + 1 - len(patterns[index][0]), i + 1, index
+
+
+class Gazetteer:
+    def __init__(self, entries):
+        patterns = []
+        for canonical, kind, variants in entries:
+            for name in {canonical, *variants}:
+                patterns.append((fold(name), (canonical, kind)))
+        self.size = len(entries)
+        self.automaton = AhoCorasick(patterns)
+
+    @classmethod
+    def load(cls, path=GAZETTEER_PATH):
+        entries = []
+        for line in path.read_text(encoding="utf-8").splitlines():
+            if not line.strip() or line.startswith("#"):
+                continue
+            canonical, kind, variants = (line.split("\t") + ["", ""])[:3]
+            entries.append((canonical, kind, [v for v in variants.split("|") if v]))
+        return cls(entries)
+
+    def extract(self, text):
+        """Leftmost-longest, non-overlapping entities found in `text`.
+
+        A match must start at a word boundary. It must also end at one in Latin
+        text; Telugu and Hindi attach case suffixes ("తిరుపతిలో", in Tirupati)
+        so a match there may run into the rest of the word.
+        """
+        folded, spans = fold_with_spans(text)
+        candidates = []
+        for start, end, index in self.automaton.iter(folded):
+            if start > 0 and _is_word_char(folded[start - 1]):
+                continue
+            if end < len(folded) and _is_word_char(folded[end]) and folded[end - 1].isascii():
+                continue
+            candidates.append((start, -end, index))
+        candidates.sort()
+        entities = []
+        last_end = 0
+        for start, neg_end, index in candidates:
+            if start < last_end:
+                continue
+            last_end = -neg_end
+            canonical, kind = self.automaton.patterns[index][1]
+            # Offsets are reported in `text`, whatever folding did to its length
+            if spans is not None:
+                start, end = spans[start][0], spans[last_end - 1][1]
+            else:
+                end = last_end
+            entities.append(Entity(canonical, kind, start, end, text[start:end]))
+        return entities
+
+    def highlight(self, text):
+        """Wrap entities in **bold** unless they already sit inside a bold span."""
+        out = []
+        pos = 0
+        bold_spans = _bold_spans(text)
+        for entity in self.extract(text):
+            if any(start <= entity.start < end for start, end in bold_spans):
+                continue
+            out.append(text[pos:entity.start])
+            out.append(f"**{text[entity.start:entity.end]}**")
+            pos = entity.end
+        out.append(text[pos:])
+        return "".join(out)
+
+
+def _bold_spans(text):
+    spans = []
+    start = text.find("**")
+    while start >= 0:
+        end = text.find("**", start + 2)
+        if end < 0:
+            break
+        spans.append((start, end + 2))
+        start = text.find("**", end + 2)
+    return spans
+
+
+_gazetteer = None
+
+
+def get_gazetteer():
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = Gazetteer.load()
+    return _gazetteer
+
+
+def extract(text):
+    return get_gazetteer().extract(text)
+
+
+def highlight(text):
+    return get_gazetteer().highlight(text)
+
+
+def bench(rounds=200):
+    from .markdown import _sample_answer
+
+    gazetteer = get_gazetteer()
+    texts = kb.SAMPLE_QUERIES + [p["text"] for p in kb.load_index().passages] + [_sample_answer(50)]
+    size = sum(len(t) for t in texts)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            gazetteer.extract(text)
+    elapsed = time.perf_counter() - started
+    print(f"{gazetteer.size} entries, {len(gazetteer.automaton.patterns)} patterns, "
+          f"{len(gazetteer.automaton._goto)} automaton states")
+    print(f"{size * rounds / elapsed / 1e6:.2f} M chars/s, "
+          f"{elapsed / (rounds * len(texts)) * 1e6:.1f} us/text")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["bench"]:
+        bench()
+    else:
+        for entity in extract(" ".join(sys.argv[1:])):
+            print(f"{entity.kind:<12} {entity.canonical:<24} {entity.surface}")
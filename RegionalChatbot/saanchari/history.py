@@ -0,0 +1,16 @@
+"""Paging helpers that keep transcript rendering bounded for long chats."""
+
+# Messages shown per page of history
+PAGE_SIZE = 20
+
+
+def visible_window(messages, pages=1, page_size=PAGE_SIZE):
+    """Return (hidden_count, visible) for the newest `pages` pages of `messages`."""
+    shown = max(1, pages) * page_size
+    hidden = max(0, len(messages) - shown)
+    return hidden, messages[hidden:]
+
+
+def first_index(messages):
+    """Oldest index still readable; stores that evict old messages expose it."""
+    return getattr(messages, "oldest_index", 0)
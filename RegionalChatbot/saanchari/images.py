@@ -0,0 +1,295 @@
+"""Photo questions ("what is this?"): image preprocessing, caching and the multimodal model call.
+
+Phone photos arrive as 3-12 MB JPEGs of 12+ megapixels with EXIF (GPS
+position, camera, orientation). Before they are sent to Gemini they are
+decoded at reduced size (JPEG draft mode, so a 12 MP photo is never held at
+full resolution), rotated upright, downsized to MAX_SIDE, and re-encoded as
+a plain JPEG without metadata. This runs on a small thread pool, which both
+keeps decoding off the event loop and caps how many photos are in memory
+at once.
+
+Answers are cached by the photo's SHA-256 (the same upload skips decoding
+too) and by a 64-bit difference hash, so a re-sent, recompressed or
+resized copy of a photo is answered without the model.
+
+    python -m saanchari.images photo.jpg
+    python -m saanchari.images bench
+"""
+import asyncio
+import hashlib
+import io
+import math
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import engine, metrics
+from .cache import cache_key
+from .models import STANDARD
+from .prompts import SYSTEM_PROMPT
+
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+# Larger images are refused before decoding (50 MP, beyond any phone camera's default mode)
+MAX_IMAGE_PIXELS = 50_000_000
+# Gemini reads images in 768 px tiles: a larger photo costs more tokens without helping recognition
+MAX_SIDE = int(os.getenv("SAANCHARI_IMAGE_MAX_SIDE", "768"))
+JPEG_QUALITY = 80
+PREPROCESS_WORKERS = 2
+
+# Photos whose difference hashes differ in at most this many of 64 bits are the same photo
+MAX_HASH_DISTANCE = 6
+MAX_PHOTOS = 256
+
+IMAGE_TYPES = ["jpg", "jpeg", "png", "webp"]
+DEFAULT_QUESTION = "What is this, and what should I know about it as a visitor?"
+
+PHOTO_INSTRUCTIONS = (
+    "The user has attached a photo. Say what it most likely shows (a temple, dish, place, festival or craft), "
+    "how sure you are, and answer their question about it for a visitor to Andhra Pradesh. "
+    "If it is not related to Andhra Pradesh, say so briefly."
+)
+
+
+class ImageError(ValueError):
+    """The upload is not an image we can use; the message is shown to the user."""
+
+
+class PreparedImage:
+    __slots__ = ("data", "width", "height", "source_bytes", "decoded_pixels", "dhash", "seconds")
+
+    def __init__(self, data, width, height, source_bytes, decoded_pixels, dhash, seconds):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.source_bytes = source_bytes
+        self.decoded_pixels = decoded_pixels
+        self.dhash = dhash
+        self.seconds = seconds
+
+    @property
+    def part(self):
+        """Gemini content part for the image."""
+        return {"mime_type": "image/jpeg", "data": self.data}
+
+    def __repr__(self):
+        return (f"PreparedImage({self.width}x{self.height}, {len(self.data)} bytes from {self.source_bytes}, "
+                f"dhash={self.dhash:016x}, {self.seconds * 1000:.0f} ms)")
+
+
+def dhash(image):
+    """64-bit difference hash: brightness gradients of a 9x8 thumbnail, robust to scaling and recompression."""
+    small = image.convert("L").resize((9, 8), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] < pixels[row * 9 + col + 1])
+    return bits
+
+
+def _flatten(image):
+    """RGB image, with transparency composited onto white."""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def prepare(data, max_side=MAX_SIDE, quality=JPEG_QUALITY):
+    """Downsized, upright, metadata-free JPEG of an uploaded photo; raises ImageError."""
+    started = time.perf_counter()
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise ImageError(f"This photo is too large ({len(data) // (1024 * 1024)} MB); please send one under "
+                         f"{MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.width * image.height > MAX_IMAGE_PIXELS:
+            raise ImageError(f"This image is too large ({image.width}x{image.height}); please send a smaller one.")
+        # JPEGs decode straight at 1/2, 1/4 or 1/8 scale, as long as that still covers the target size
+        scale = max_side / max(image.size)
+        if scale < 1:
+            image.draft("RGB", (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ImageError("Sorry, I couldn't read that file as a photo. Please send a JPEG, PNG or WebP image.") from e
+    decoded_pixels = image.width * image.height
+    image.thumbnail((max_side, max_side), Image.Resampling.BICUBIC, reducing_gap=2.0)
+    # Apply the camera's orientation now, since EXIF (and with it the orientation tag) is dropped
+    image = _flatten(ImageOps.exif_transpose(image))
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=quality)
+    seconds = time.perf_counter() - started
+    metrics.observe("images.prepare_seconds", seconds)
+    metrics.incr("images.bytes_in", len(data))
+    metrics.incr("images.bytes_out", out.tell())
+    return PreparedImage(out.getvalue(), image.width, image.height, len(data), decoded_pixels, dhash(image), seconds)
+
+
+_pool = ThreadPoolExecutor(max_workers=PREPROCESS_WORKERS, thread_name_prefix="saanchari-image")
+
+
+async def prepare_async(data, max_side=MAX_SIDE):
+    """prepare() on the preprocessing pool."""
+    return await asyncio.get_running_loop().run_in_executor(_pool, prepare, data, max_side)
+
+
+def build_photo_prompt(question, image):
+    """Multimodal prompt: instructions and question, then the photo."""
+    return [f"{SYSTEM_PROMPT}\n{PHOTO_INSTRUCTIONS}\n\nUser question: {question}", image.part]
+
+
+class PhotoCache:
+    """English answers to photo questions, by exact upload and by similar-looking photo."""
+
+    def __init__(self, max_entries=MAX_PHOTOS, max_distance=MAX_HASH_DISTANCE):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._by_digest = OrderedDict()
+        # (question key, dhash) -> answer, scanned for near matches
+        self._by_hash = OrderedDict()
+        self._lock = threading.Lock()
+
+    def exact(self, digest, question):
+        with self._lock:
+            return self._by_digest.get((digest, cache_key(question)))
+
+    def similar(self, image_hash, question):
+        key = cache_key(question)
+        with self._lock:
+            best = None
+            for (question_key, other), text in self._by_hash.items():
+                if question_key == key:
+                    distance = (image_hash ^ other).bit_count()
+                    if distance <= self.max_distance and (best is None or distance < best[0]):
+                        best = (distance, text)
+        return best[1] if best else None
+
+    def put(self, digest, image_hash, question, text):
+        key = cache_key(question)
+        with self._lock:
+            for entries, entry_key in ((self._by_digest, (digest, key)), (self._by_hash, (key, image_hash))):
+                entries[entry_key] = text
+                entries.move_to_end(entry_key)
+                while len(entries) > self.max_entries:
+                    entries.popitem(last=False)
+
+
+photo_answers = PhotoCache()
+
+
+def photo_answer(data, question, models, cache=photo_answers, on_usage=None):
+    """GenerationJob `stream` answering a photo question in English.
+
+    `on_usage(model name, usage)` is called if the model was asked.
+    """
+
+    async def answer(token):
+        digest = hashlib.sha256(data).hexdigest()
+        text = cache.exact(digest, question)
+        image = None
+        if text is None:
+            token.raise_if_cancelled("prepare")
+            image = await prepare_async(data)
+            text = cache.similar(image.dhash, question)
+        if text is not None:
+            metrics.incr("images.cache_hits")
+            yield text
+            return
+        metrics.incr("images.model_calls")
+        choice = models.choose(question, tier=STANDARD)
+        record = (lambda usage: on_usage(choice.name, usage)) if on_usage else None
+        parts = []
+        async for text in engine.stream_reply(choice.model, build_photo_prompt(question, image), token, record,
+                                              choice.generation_config):
+            parts.append(text)
+            yield text
+        cache.put(digest, image.dhash, question, "".join(parts).strip())
+
+    return answer
+
+
+def _sample_photo(width=4032, height=3024, seed=1):
+    """A smooth, photo-like test image as a camera JPEG with EXIF (orientation, camera, GPS)."""
+    import random
+
+    from PIL import ImageDraw, ImageFilter
+
+    rand = random.Random(seed)
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rand.randrange(width), rand.randrange(height)
+        r = rand.randrange(width // 30, width // 6)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rand.randrange(256) for _ in range(3)))
+    image = image.filter(ImageFilter.GaussianBlur(8))
+    image = Image.blend(image, Image.effect_noise((width, height), 24).convert("RGB"), 0.08)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90 degrees, as phones store portrait photos
+    exif[0x010F] = "PhoneMaker"
+    exif[0x0110] = "Phone 15"
+    exif[0x8825] = {1: "N", 2: (17.0, 41.0, 12.5), 3: "E", 4: (83.0, 13.0, 7.1)}
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=92, exif=exif)
+    return out.getvalue()
+
+
+def _naive(data):
+    """The straightforward pipeline: full decode, high-quality resize, re-encode keeping EXIF."""
+    image = Image.open(io.BytesIO(data))
+    exif = image.info.get("exif", b"")
+    image = image.convert("RGB").resize((MAX_SIDE, MAX_SIDE * image.height // image.width), Image.Resampling.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=95, exif=exif)
+    return out.getvalue()
+
+
+def _bench(photos=8):
+    samples = [_sample_photo(seed=seed) for seed in range(photos)]
+    print(f"{photos} camera JPEGs, 4032x3024, {sum(map(len, samples)) / photos / 1e6:.1f} MB each on average")
+
+    started = time.perf_counter()
+    naive = [_naive(data) for data in samples]
+    naive_seconds = (time.perf_counter() - started) / photos
+    started = time.perf_counter()
+    prepared = [prepare(data) for data in samples]
+    serial_seconds = (time.perf_counter() - started) / photos
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=PREPROCESS_WORKERS) as pool:
+        list(pool.map(prepare, samples))
+    pooled_seconds = (time.perf_counter() - started) / photos
+
+    first = prepared[0]
+    print(f"full decode + LANCZOS: {naive_seconds * 1000:5.0f} ms/photo, sends {sum(map(len, naive)) / photos / 1e3:5.0f} KB, "
+          f"decodes 12.2 MP ({4032 * 3024 * 3 / 1e6:.1f} MB RGB)")
+    print(f"draft + thumbnail:     {serial_seconds * 1000:5.0f} ms/photo, sends "
+          f"{sum(len(p.data) for p in prepared) / photos / 1e3:5.0f} KB, decodes {first.decoded_pixels / 1e6:.1f} MP "
+          f"({first.decoded_pixels * 3 / 1e6:.1f} MB RGB), {first.width}x{first.height} upright, no EXIF")
+    print(f"  on {PREPROCESS_WORKERS} pool threads:     {pooled_seconds * 1000:5.0f} ms/photo throughput")
+    print(f"  EXIF kept by full decode: {len(Image.open(io.BytesIO(naive[0])).getexif())} tags; "
+          f"after prepare(): {len(Image.open(io.BytesIO(first.data)).getexif())} tags")
+
+    # The same photo re-sent after recompression and resizing, against different photos
+    copy = io.BytesIO()
+    original = Image.open(io.BytesIO(samples[0]))
+    original.resize((2016, 1512)).save(copy, "JPEG", quality=60, exif=original.info["exif"])
+    resent = prepare(copy.getvalue())
+    same = (first.dhash ^ resent.dhash).bit_count()
+    others = [(first.dhash ^ p.dhash).bit_count() for p in prepared[1:]]
+    print(f"dhash distance: recompressed, resized copy {same} bits; other photos {min(others)}-{max(others)} bits "
+          f"(same photo at <= {MAX_HASH_DISTANCE})")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["bench"]:
+        _bench()
+    else:
+        for path in sys.argv[1:]:
+            with open(path, "rb") as f:
+                print(path, prepare(f.read()))
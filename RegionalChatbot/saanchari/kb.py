@@ -0,0 +1,210 @@
+"""Offline Andhra Pradesh knowledge base with a prebuilt BM25 inverted index.
+
+    python -m saanchari.kb build            # rebuild data/kb_index.json from data/kb.json
+    python -m saanchari.kb query "best time to visit araku"
+    python -m saanchari.kb bench            # query latency over sample questions
+"""
+import json
+import math
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent / "data"
+SOURCE_PATH = DATA_DIR / "kb.json"
+INDEX_PATH = DATA_DIR / "kb_index.json"
+INDEX_FORMAT = 1
+
+K1 = 1.5
+B = 0.75
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or "
+    "the there this to visit was what when where which who why with you your "
+    "tell about please some any best".split()
+    + "గురించి చెప్పండి ఏమిటి ఎక్కడ ఎలా లో".split()
+    + "के की का में है क्या कहाँ बताइए बताओ और".split()
+)
+
+_WORD_CATEGORIES = ("L", "M", "N")
+
+
+def words(text):
+    """Split text into case-folded words.
+
+    Word characters are letters, combining marks and digits, so Telugu and
+    Devanagari words keep their vowel signs and viramas.
+    """
+    text = unicodedata.normalize("NFC", text).casefold()
+    out = []
+    word = []
+    for ch in text:
+        if unicodedata.category(ch)[0] in _WORD_CATEGORIES:
+            word.append(ch)
+        elif word:
+            out.append("".join(word))
+            word = []
+    if word:
+        out.append("".join(word))
+    return out
+
+
+def tokenize(text):
+    """Index terms for `text`: words minus stopwords, Latin terms lightly de-pluralised."""
+    terms = []
+    for word in words(text):
+        if word in STOPWORDS:
+            continue
+        if word.isascii() and len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def passage_terms(passage, tag_aliases=None):
+    # Titles and aliases count double so "Borra" finds the Borra Caves entry first
+    head = " ".join([passage["title"], *passage.get("aliases", [])])
+    tags = []
+    for tag in passage.get("tags", []):
+        tags.append(tag)
+        tags.extend((tag_aliases or {}).get(tag, []))
+    return tokenize(head) * 2 + tokenize(" ".join(tags)) + tokenize(passage["text"])
+
+
+class BM25Index:
+    """Inverted index of term -> [[doc, term frequency], ...] scored with BM25."""
+
+    def __init__(self, version, passages, postings, lengths):
+        self.version = version
+        self.passages = passages
+        self.postings = postings
+        self.lengths = lengths
+        self.avg_length = sum(lengths) / len(lengths) if lengths else 0.0
+        n = len(passages)
+        self.idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+
+    @classmethod
+    def build(cls, version, passages, tag_aliases=None):
+        postings = {}
+        lengths = []
+        for doc, passage in enumerate(passages):
+            terms = passage_terms(passage, tag_aliases)
+            lengths.append(len(terms))
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append([doc, tf])
+        return cls(version, passages, postings, lengths)
+
+    def to_json(self):
+        return {
+            "format": INDEX_FORMAT,
+            "version": self.version,
+            "passages": self.passages,
+            "postings": self.postings,
+            "lengths": self.lengths,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["version"], data["passages"], data["postings"], data["lengths"])
+
+    def search(self, query, k=3):
+        """Return up to `k` (score, passage) pairs, best first."""
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf[term]
+            for doc, tf in docs:
+                norm = K1 * (1 - B + B * self.lengths[doc] / self.avg_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(score, self.passages[doc]) for doc, score in best]
+
+
+def build_index(source=SOURCE_PATH, out=INDEX_PATH):
+    data = json.loads(Path(source).read_text(encoding="utf-8"))
+    index = BM25Index.build(data["version"], data["passages"], data.get("tag_aliases"))
+    Path(out).write_text(json.dumps(index.to_json(), ensure_ascii=False), encoding="utf-8")
+    return index
+
+
+_index = None
+
+
+def load_index():
+    """Load the prebuilt index, rebuilding it if it is missing or older than the source."""
+    global _index
+    if _index is None:
+        source = json.loads(SOURCE_PATH.read_text(encoding="utf-8"))
+        index = None
+        if INDEX_PATH.exists():
+            data = json.loads(INDEX_PATH.read_text(encoding="utf-8"))
+            if data.get("format") == INDEX_FORMAT and data.get("version") == source["version"]:
+                index = BM25Index.from_json(data)
+        _index = index or BM25Index.build(
+            source["version"], source["passages"], source.get("tag_aliases")
+        )
+    return _index
+
+
+def search(query, k=3):
+    return load_index().search(query, k)
+
+
+def format_passages(results):
+    """Render search results as the markdown reference block used in prompts and answers."""
+    return "\n".join(f"- **{passage['title']}**: {passage['text']}" for _, passage in results)
+
+
+SAMPLE_QUERIES = [
+    "What are the top tourist attractions in Andhra Pradesh?",
+    "Tell me about the famous food in Andhra Pradesh.",
+    "ఆంధ్రప్రదేశ్‌లో ప్రసిద్ధ ఆహారం గురించి చెప్పండి",
+    "best time to visit araku valley",
+    "how to book tirupati darshan",
+    "तिरुपति मंदिर के बारे में बताइए",
+    "pootharekulu sweet",
+    "trains to vizag",
+    "gandikota camping",
+    "Sankranti festival celebrations",
+]
+
+
+def bench(rounds=2000):
+    index = load_index()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for query in SAMPLE_QUERIES:
+            index.search(query)
+    elapsed = time.perf_counter() - started
+    queries = rounds * len(SAMPLE_QUERIES)
+    print(f"{len(index.passages)} passages, {len(index.postings)} terms, index {index.version}")
+    print(f"{queries} queries: {elapsed / queries * 1e6:.1f} us/query")
+
+
+def main(argv):
+    command = argv[0] if argv else "build"
+    if command == "build":
+        index = build_index()
+        print(f"Built {INDEX_PATH.name}: {len(index.passages)} passages, {len(index.postings)} terms")
+    elif command == "query":
+        for score, passage in search(" ".join(argv[1:]), k=5):
+            print(f"{score:6.2f}  {passage['id']:<20} {passage['title']}")
+    elif command == "bench":
+        bench()
+    else:
+        print(__doc__)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,129 @@
+"""Offline language detection for incoming questions.
+
+Native Telugu and Hindi are recognized from Unicode script ranges. Latin text
+is English unless enough of its words are common romanized Telugu or Hindi
+function words ("araku lo em chudali", "tirupati kaise jaye").
+
+    python -m saanchari.langdetect "ఆంధ్రప్రదేశ్‌లో ప్రసిద్ధ ఆహారం"
+    python -m saanchari.langdetect eval     # accuracy and latency on data/langdetect.tsv
+"""
+import sys
+import time
+from collections import namedtuple
+
+from . import kb
+
+LABELS_PATH = kb.DATA_DIR / "langdetect.tsv"
+
+NATIVE = "native"
+ROMANIZED = "romanized"
+
+# (first, last) code points of each script we answer in
+SCRIPT_RANGES = {
+    "te": (0x0C00, 0x0C7F),
+    "hi": (0x0900, 0x097F),
+}
+
+# A script must supply this share of the words before it decides the language
+MIN_SCRIPT_SHARE = 0.3
+# ...and romanized function words this share of the words of Latin text
+MIN_ROMANIZED_SHARE = 0.25
+
+ROMANIZED_MARKERS = {
+    "te": frozenset(
+        "lo em emi enti ekkada ela elaa cheppandi cheppu chudali choodali chudataniki "
+        "undi unnayi unnai kavali kaavali vellali vellalante velladam entha enta chala "
+        "baagundi bagundi meeru nenu naaku maaku ki ni ku kuda inka ledu ayithe "
+        "dorukutundi dorukuthundi ekkadiki evaru eppudu manchi vunnayi".split()
+    ),
+    "hi": frozenset(
+        "kya hai hain kahan kahaan kaise kaisa mein me ke ki ka bare baare batao batayiye "
+        "bataiye jana jaana jaye jaaye ghumne ghoomne accha achha kitna kitne kaun se aur "
+        "nahi chahiye hoga milta milega sabse acha karein kare dekhne".split()
+    ),
+}
+
+Detection = namedtuple("Detection", "lang script confidence")
+
+
+def _script_of(word):
+    code = ord(word[0])
+    for lang, (first, last) in SCRIPT_RANGES.items():
+        if first <= code <= last:
+            return lang
+    return None
+
+
+def detect(text):
+    """Language of `text` as a Detection; English when nothing else is clear.
+
+    Shares are counted per word rather than per character, so a Telugu
+    question that borrows English place names ("Tirupati లో darshan timings
+    ఏమిటి?") is still Telugu.
+    """
+    words = kb.words(text)
+    if not words:
+        return Detection("en", NATIVE, 0.0)
+    counts = dict.fromkeys(SCRIPT_RANGES, 0)
+    latin = []
+    for word in words:
+        lang = _script_of(word)
+        if lang is None:
+            latin.append(word)
+        else:
+            counts[lang] += 1
+    lang = max(counts, key=counts.get)
+    share = counts[lang] / len(words)
+    if counts[lang] and share >= MIN_SCRIPT_SHARE:
+        return Detection(lang, NATIVE, share)
+    marks = {lang: sum(1 for w in latin if w in markers) for lang, markers in ROMANIZED_MARKERS.items()}
+    lang = max(marks, key=marks.get)
+    share = marks[lang] / len(words)
+    if marks[lang] >= 2 and share >= MIN_ROMANIZED_SHARE:
+        return Detection(lang, ROMANIZED, share)
+    return Detection("en", NATIVE, 1 - share)
+
+
+def answer_language(detection, selected):
+    """Answer in the language the user wrote in, else the one they selected."""
+    return detection.lang if detection.lang != "en" else selected
+
+
+def needs_translation(detection):
+    """Native-script questions are translated to English before retrieval and prompting.
+
+    Romanized questions stay as typed: the model reads them directly and they
+    already share entity names with the knowledge base.
+    """
+    return detection.lang != "en" and detection.script == NATIVE
+
+
+def load_labels(path=LABELS_PATH):
+    rows = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip() and not line.startswith("#"):
+            text, label = line.rsplit("\t", 1)
+            rows.append((text, label.strip()))
+    return rows
+
+
+def evaluate(path=LABELS_PATH, rounds=200):
+    rows = load_labels(path)
+    wrong = [(text, label, got) for text, label in rows
+             if (got := "/".join(detect(text)[:2])) != label]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for text, _ in rows:
+            detect(text)
+    elapsed = time.perf_counter() - started
+    print(f"{len(rows) - len(wrong)}/{len(rows)} correct ({1 - len(wrong) / len(rows):.1%}), "
+          f"{elapsed / (rounds * len(rows)) * 1e6:.1f} us/question")
+    for text, label, got in wrong:
+        print(f"  expected {label:<14} got {got:<14} {text}")
+    return not wrong
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["eval"]:
+        sys.exit(0 if evaluate() else 1)
+    print(detect(" ".join(sys.argv[1:])))
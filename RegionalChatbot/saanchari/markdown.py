@@ -0,0 +1,312 @@
+"""Single-pass, incremental renderer for the markdown subset Saanchari answers use.
+
+Supports **bold**, *italics*, `#` headings and bulleted (`-`, `*`, `•`) or
+numbered lists of any length. Text is consumed as streamed deltas: every
+completed line is turned into HTML exactly once, so the cost of a delta is
+proportional to the delta plus the current (unfinished) line.
+
+Output is a list of small ops the chat pane can apply to the DOM directly:
+
+    ["open", "ul"] / ["open", "ol", start]   start a list
+    ["item", html]                             add an item to the open list
+    ["close"]                                  close the open list
+    ["block", html]                            add a paragraph or heading
+
+    python -m saanchari.markdown check
+    python -m saanchari.markdown bench
+"""
+import random
+import re
+import sys
+import time
+from html import escape
+from html.parser import HTMLParser
+
+_BULLET = re.compile(r"\s*[-*•]\s+(.*)")
+_NUMBERED = re.compile(r"\s*(\d+)[.)]\s+(.*)")
+_HEADING = re.compile(r"\s*(#{1,6})\s+(.*)")
+
+_OPEN = {"**": "<strong>", "*": "<em>"}
+_CLOSE = {"**": "</strong>", "*": "</em>"}
+
+
+def render_inline(text, close_open=False):
+    """Escape `text` and convert ** and * spans in one left-to-right pass.
+
+    Unmatched markers are kept as literal asterisks, unless `close_open` is
+    set (used while a line is still streaming), in which case open spans are
+    closed at the end so a half-received **bold run already shows as bold.
+    """
+    out = []
+    stack = []
+    start = 0
+    i = text.find("*")
+    while i >= 0:
+        if start < i:
+            out.append(escape(text[start:i], quote=False))
+        marker = "**" if text.startswith("**", i) else "*"
+        if stack and stack[-1][0] == marker:
+            stack.pop()
+            out.append(_CLOSE[marker])
+        elif any(open_marker == marker for open_marker, _ in stack):
+            # Closing a span that is not innermost would mis-nest the tags
+            out.append(marker)
+        else:
+            stack.append((marker, len(out)))
+            out.append(_OPEN[marker])
+        start = i + len(marker)
+        i = text.find("*", start)
+    if start < len(text):
+        out.append(escape(text[start:], quote=False))
+    if close_open:
+        for marker, _ in reversed(stack):
+            out.append(_CLOSE[marker])
+    else:
+        for marker, index in stack:
+            out[index] = marker
+    return "".join(out)
+
+
+def classify(line):
+    """Return (kind, text, number) for one line of markdown."""
+    if not line.strip():
+        return "blank", "", None
+    match = _HEADING.match(line)
+    if match:
+        return f"h{len(match.group(1))}", match.group(2).strip(), None
+    match = _BULLET.match(line)
+    if match:
+        return "ul", match.group(1).strip(), None
+    match = _NUMBERED.match(line)
+    if match:
+        return "ol", match.group(2).strip(), int(match.group(1))
+    return "p", line.strip(), None
+
+
+def _open_op(kind, number):
+    if kind == "ol" and number not in (None, 1):
+        return ["open", kind, number]
+    return ["open", kind]
+
+
+class StreamingRenderer:
+    """Consume text deltas and emit DOM ops for every line they complete."""
+
+    def __init__(self):
+        self._line = []
+        self._list = None
+
+    def feed(self, delta):
+        ops = []
+        start = 0
+        while True:
+            newline = delta.find("\n", start)
+            if newline < 0:
+                if start < len(delta):
+                    self._line.append(delta[start:])
+                return ops
+            self._line.append(delta[start:newline])
+            line = "".join(self._line)
+            self._line = []
+            self._complete(line, ops)
+            start = newline + 1
+
+    def finish(self):
+        """Flush the last line and close any open list."""
+        ops = []
+        if self._line:
+            line = "".join(self._line)
+            self._line = []
+            self._complete(line, ops)
+        if self._list:
+            ops.append(["close"])
+            self._list = None
+        return ops
+
+    def tail(self):
+        """HTML preview of the line still being received."""
+        if not self._line:
+            return ""
+        kind, text, number = classify("".join(self._line))
+        if kind == "blank":
+            return ""
+        body = render_inline(text, close_open=True)
+        if kind in ("ul", "ol"):
+            return to_html([_open_op(kind, number), ["item", body], ["close"]])
+        return f"<{kind}>{body}</{kind}>"
+
+    def _complete(self, line, ops):
+        kind, text, number = classify(line)
+        if kind == "blank":
+            # Blank lines between items keep the list open
+            return
+        if kind in ("ul", "ol"):
+            if self._list != kind:
+                if self._list:
+                    ops.append(["close"])
+                ops.append(_open_op(kind, number))
+                self._list = kind
+            ops.append(["item", render_inline(text)])
+            return
+        if self._list:
+            ops.append(["close"])
+            self._list = None
+        ops.append(["block", f"<{kind}>{render_inline(text)}</{kind}>"])
+
+
+def to_html(ops):
+    """Serialize renderer ops into an HTML string."""
+    out = []
+    open_lists = []
+    for op in ops:
+        if op[0] == "open":
+            open_lists.append(op[1])
+            out.append(f"<ol start='{op[2]}'>" if len(op) > 2 else f"<{op[1]}>")
+        elif op[0] == "item":
+            out.append(f"<li>{op[1]}</li>")
+        elif op[0] == "close":
+            out.append(f"</{open_lists.pop()}>")
+        else:
+            out.append(op[1])
+    return "".join(out)
+
+
+def render_markdown(text):
+    """Render a complete answer to HTML."""
+    renderer = StreamingRenderer()
+    return to_html(renderer.feed(text) + renderer.finish())
+
+
+def _sample_answer(items=150):
+    lines = ["## **Andhra Pradesh** highlights"]
+    for i in range(items):
+        lines.append(f"* **Place {i}**: a *lovely* spot near **Tirupati** with food and views")
+        if i % 10 == 9:
+            lines.append("")
+            lines.append(f"{i // 10 + 1}. **Tip**: visit early in the morning")
+    return "\n".join(lines)
+
+
+def _regex_render(text):
+    """The regex-based renderer display_message used before this module, kept as the bench baseline."""
+    text = re.sub(r"\*\*(.*?)\*\*", r"<strong>\1</strong>", text)
+    text = re.sub(r"\*(.*?)\*", r"<em>\1</em>", text)
+    lines = []
+    in_list = False
+    for line in text.split("\n"):
+        line = line.strip()
+        if line.startswith("• ") or line.startswith("- "):
+            if not in_list:
+                lines.append("<ul>")
+                in_list = True
+            lines.append(f"<li>{line[2:]}</li>")
+        elif line.startswith(("1. ", "2. ", "3. ", "4. ", "5. ", "6. ", "7. ", "8. ", "9. ")):
+            if not in_list:
+                lines.append("<ol>")
+                in_list = True
+            lines.append(f"<li>{line[3:]}</li>")
+        else:
+            if in_list:
+                lines.append("</ul>" if lines[-2].startswith("<ul>") else "</ol>")
+                in_list = False
+            if line:
+                lines.append(f"<p>{line}</p>")
+    if in_list:
+        lines.append("</ul>")
+    return "".join(lines)
+
+
+def bench(items=150):
+    """Compare the old display_message path, re-run on the whole answer per streamed word, with incremental rendering."""
+    text = _sample_answer(items)
+    words = re.findall(r"\S+\s*", text)
+
+    started = time.perf_counter()
+    prefix = ""
+    for word in words:
+        prefix += word
+        _regex_render(prefix)
+    old = time.perf_counter() - started
+
+    started = time.perf_counter()
+    renderer = StreamingRenderer()
+    for word in words:
+        renderer.feed(word)
+        renderer.tail()
+    renderer.finish()
+    incremental = time.perf_counter() - started
+
+    print(f"{len(words)} deltas, {len(text)} chars")
+    print(f"display_message re-render per delta: {old / len(words) * 1e6:9.1f} us/delta")
+    print(f"incremental:                         {incremental / len(words) * 1e6:9.1f} us/delta")
+
+
+class _TagBalance(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.stack = []
+        self.errors = []
+
+    def handle_starttag(self, tag, attrs):
+        self.stack.append(tag)
+
+    def handle_endtag(self, tag):
+        if not self.stack or self.stack.pop() != tag:
+            self.errors.append(f"unexpected </{tag}>")
+
+
+def unbalanced(html):
+    """Why `html` is not a well-nested fragment, or None if it is."""
+    parser = _TagBalance()
+    parser.feed(html)
+    parser.close()
+    if parser.stack:
+        parser.errors.append(f"unclosed <{parser.stack[-1]}>")
+    return "; ".join(parser.errors) or None
+
+
+_PIECES = ["**", "*", "Tirupati", " temple", " & ", "<b>", "2 < 3", "\n", "\n\n", "- ", "* ", "• ",
+           "1. ", "12) ", "## ", "# ", "  ", "Araku", " coffee", "`x`", ":", "ఆంధ్ర", "***"]
+
+
+def _random_answer(rand):
+    return "".join(rand.choice(_PIECES) for _ in range(rand.randint(1, 80)))
+
+
+def check(cases=3000, seed=7):
+    """Rendering random deltas of an answer must match rendering it whole, as balanced HTML."""
+    rand = random.Random(seed)
+    failures = 0
+    texts = [_sample_answer(20)] + [_random_answer(rand) for _ in range(cases)]
+    for text in texts:
+        whole = render_markdown(text)
+        cuts = sorted(rand.sample(range(1, len(text)), min(len(text) - 1, rand.randint(0, 12))))
+        renderer = StreamingRenderer()
+        ops = []
+        problem = None
+        for start, end in zip([0] + cuts, cuts + [len(text)]):
+            ops += renderer.feed(text[start:end])
+            problem = unbalanced(renderer.tail())
+            if problem:
+                problem = f"tail after {end} chars: {problem}"
+                break
+        streamed = to_html(ops + renderer.finish())
+        if problem is None and streamed != whole:
+            problem = f"streamed {streamed!r} != whole {whole!r}"
+        if problem is None:
+            problem = unbalanced(whole)
+        if problem:
+            failures += 1
+            if failures <= 5:
+                print(f"  {text!r}: {problem}")
+    print(f"{len(texts) - failures}/{len(texts)} answers render the same streamed and whole, balanced")
+    return not failures
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["check"]:
+        sys.exit(0 if check() else 1)
+    if sys.argv[1:2] == ["bench"]:
+        bench(*(int(arg) for arg in sys.argv[2:3]))
+    else:
+        sys.stdout.write(render_markdown(sys.stdin.read()) + "\n")
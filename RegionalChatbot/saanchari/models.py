@@ -0,0 +1,251 @@
+"""Pick a Gemini model and output length per question from complexity and observed health.
+
+Each question gets a complexity tier (light, standard, heavy) from its length,
+the places it names and planning words like "itinerary" or "10 days". A tier
+lists acceptable models in order of preference; among those the router takes
+the one with the lowest expected cost in seconds:
+
+    preference rank * RANK_SECONDS + first-chunk latency (EWMA) + error rate (EWMA) * ERROR_SECONDS
+
+Observations fade back to the model's expected latency when it gets no
+traffic, so a model that was routed around is tried again once it has had
+time to recover.
+
+    python -m saanchari.models "Plan a 10 day trip to Vizag, Araku and Tirupati"
+    python -m saanchari.models simulate
+"""
+import math
+import random
+import re
+import sys
+import threading
+import time
+
+from . import gazetteer, kb, metrics
+
+LIGHT = "light"
+STANDARD = "standard"
+HEAVY = "heavy"
+
+
+class ModelSpec:
+    __slots__ = ("name", "expected_latency")
+
+    def __init__(self, name, expected_latency):
+        self.name = name
+        self.expected_latency = expected_latency
+
+
+MODELS = {
+    "gemini-1.5-flash-8b": ModelSpec("gemini-1.5-flash-8b", 0.5),
+    "gemini-1.5-flash": ModelSpec("gemini-1.5-flash", 0.8),
+    "gemini-1.5-pro": ModelSpec("gemini-1.5-pro", 2.0),
+}
+
+# Tier -> (models in order of preference, max_output_tokens)
+TIERS = {
+    LIGHT: (("gemini-1.5-flash-8b", "gemini-1.5-flash"), 512),
+    STANDARD: (("gemini-1.5-flash", "gemini-1.5-flash-8b", "gemini-1.5-pro"), 1024),
+    HEAVY: (("gemini-1.5-pro", "gemini-1.5-flash"), 2048),
+}
+
+# Seconds of latency one step down the preference list is worth
+RANK_SECONDS = 1.0
+# Seconds of latency a 100% error rate is worth
+ERROR_SECONDS = 10.0
+# Weight of the newest observation in the moving averages
+EWMA_ALPHA = 0.2
+# Unobserved models drift back to their expected latency with this half-life
+RECOVERY_HALF_LIFE = 30.0
+
+PLANNING_WORDS = frozenset(
+    "itinerary plan plans planning schedule compare comparison route budget week weekend days nights "
+    "ప్రణాళిక రోజులు योजना दिन".split()
+)
+_DAYS = re.compile(r"\b(\d+)\s*-?\s*(?:day|days|night|nights|రోజుల|दिन)", re.IGNORECASE)
+
+
+def complexity(question):
+    """Tier for `question`: one place and a short ask is light; multi-city plans are heavy."""
+    words = kb.words(question)
+    places = {e.canonical for e in gazetteer.extract(question) if e.kind == "place"}
+    score = len(words) / 12 + max(0, len(places) - 1)
+    if any(word in PLANNING_WORDS for word in words):
+        score += 1.5
+    days = [int(n) for n in _DAYS.findall(question)]
+    if days and max(days) >= 3:
+        score += 1.5
+    if score < 1:
+        return LIGHT
+    return STANDARD if score < 3 else HEAVY
+
+
+class ModelStats:
+    """Moving averages of one model's first-chunk latency and error rate."""
+
+    def __init__(self, spec, clock=time.monotonic):
+        self.spec = spec
+        self._clock = clock
+        self.latency = spec.expected_latency
+        self.error_rate = 0.0
+        self.updated = clock()
+
+    def observe(self, seconds, ok):
+        # Decay since the last observation applies before the new one is averaged in
+        self.latency, self.error_rate = self.expected()
+        if ok:
+            self.latency += EWMA_ALPHA * (seconds - self.latency)
+        self.error_rate += EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+        self.updated = self._clock()
+
+    def expected(self):
+        """(latency, error rate) decayed toward the spec's expectation since the last observation."""
+        weight = math.exp(-math.log(2) * (self._clock() - self.updated) / RECOVERY_HALF_LIFE)
+        latency = self.spec.expected_latency + (self.latency - self.spec.expected_latency) * weight
+        return latency, self.error_rate * weight
+
+
+class Choice:
+    __slots__ = ("name", "model", "tier", "max_output_tokens")
+
+    def __init__(self, name, model, tier, max_output_tokens):
+        self.name = name
+        self.model = model
+        self.tier = tier
+        self.max_output_tokens = max_output_tokens
+
+    @property
+    def generation_config(self):
+        return {"max_output_tokens": self.max_output_tokens}
+
+    def __repr__(self):
+        return f"Choice({self.name!r}, tier={self.tier!r}, max_output_tokens={self.max_output_tokens})"
+
+
+class ObservedModel:
+    """Wraps a model and reports each call's first-chunk latency and failures to a ModelRouter."""
+
+    def __init__(self, model, name, router):
+        self._model = model
+        self.model_name = name
+        self._router = router
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self._model.generate_content_async(prompt, stream=stream, **kwargs)
+        except Exception:
+            self._router.observe(self.model_name, time.perf_counter() - started, ok=False)
+            raise
+        if not stream:
+            self._router.observe(self.model_name, time.perf_counter() - started, ok=True)
+            return response
+        return self._watch(response, started)
+
+    async def _watch(self, response, started):
+        first = True
+        try:
+            async for chunk in response:
+                if first:
+                    first = False
+                    self._router.observe(self.model_name, time.perf_counter() - started, ok=True)
+                yield chunk
+        except Exception:
+            if first:
+                self._router.observe(self.model_name, time.perf_counter() - started, ok=False)
+            raise
+        finally:
+            metrics.observe(f"model.{self.model_name}.seconds", time.perf_counter() - started)
+
+
+class ModelRouter:
+    """Chooses a model per question; `factory(name)` creates the client for a model name."""
+
+    def __init__(self, factory, specs=MODELS, tiers=TIERS, clock=time.monotonic):
+        self.tiers = tiers
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._stats = {name: ModelStats(spec, clock) for name, spec in specs.items()}
+        self._models = {}
+
+    def model(self, name):
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                model = self._models[name] = ObservedModel(self._factory(name), name, self)
+            return model
+
+    def score(self, name, rank):
+        latency, error_rate = self._stats[name].expected()
+        return rank * RANK_SECONDS + latency + error_rate * ERROR_SECONDS
+
+    def choose(self, question, tier=None):
+        tier = tier or complexity(question)
+        names, max_output_tokens = self.tiers[tier]
+        with self._lock:
+            name = min(enumerate(names), key=lambda item: self.score(item[1], item[0]))[1]
+        metrics.incr(f"model.{name}.requests")
+        metrics.incr(f"model.tier.{tier}")
+        return Choice(name, self.model(name), tier, max_output_tokens)
+
+    def observe(self, name, seconds, ok):
+        with self._lock:
+            self._stats[name].observe(seconds, ok)
+        metrics.observe(f"model.{name}.first_chunk_seconds", seconds)
+        if not ok:
+            metrics.incr(f"model.{name}.errors")
+
+    def health(self):
+        """{name: (latency, error rate)} as the router currently sees them."""
+        with self._lock:
+            return {name: stats.expected() for name, stats in self._stats.items()}
+
+
+def _simulate(rounds=6, per_round=100, interval=0.5, seed=0):
+    """Degrade gemini-1.5-flash for two rounds and show standard-tier traffic moving and returning.
+
+    Requests arrive one at a time every `interval` seconds of a simulated
+    clock; latencies and failures are drawn rather than waited for, so the
+    run is quick and repeatable. Returns False unless flash lost most of the
+    traffic while degraded and won it back by the last round.
+    """
+    now = [0.0]
+    router = ModelRouter(lambda name: None, clock=lambda: now[0])
+    rng = random.Random(seed)
+    question = "Tell me about the history and food of Vijayawada and nearby temples"
+    print(f"tier: {complexity(question)}; preference {', '.join(TIERS[STANDARD][0])}")
+    flash_shares = []
+    for round_ in range(rounds):
+        degraded = round_ in (1, 2)
+        counts = dict.fromkeys(MODELS, 0)
+        errors = 0
+        for _ in range(per_round):
+            name = router.choose(question).name
+            counts[name] += 1
+            latency = MODELS[name].expected_latency
+            ok = True
+            if degraded and name == "gemini-1.5-flash":
+                latency, ok = 6.0, rng.random() >= 0.3
+            router.observe(name, latency * rng.uniform(0.9, 1.1), ok)
+            errors += not ok
+            now[0] += interval
+        state = "flash degraded (6 s, 30% errors)" if degraded else "flash healthy"
+        shares = "  ".join(f"{name} {count / per_round:4.0%}" for name, count in counts.items())
+        print(f"round {round_}: {state:<34} {shares}  errors {errors}")
+        flash_shares.append(counts["gemini-1.5-flash"] / per_round)
+    moved = max(flash_shares[1:3]) < 0.5
+    returned = flash_shares[-1] > 0.5
+    print(f"traffic moved away: {'yes' if moved else 'NO'}; came back: {'yes' if returned else 'NO'}")
+    return moved and returned
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["simulate"]:
+        sys.exit(0 if _simulate() else 1)
+    else:
+        question = " ".join(sys.argv[1:])
+        tier = complexity(question)
+        print(f"{tier}: {TIERS[tier]}")
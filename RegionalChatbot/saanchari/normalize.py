@@ -0,0 +1,130 @@
+"""Query normalization for cache keys.
+
+The same question arrives in English, Telugu, Hindi or romanized Telugu, with
+any case, punctuation and spacing. normalize() reduces all of these to one key:
+
+    1. Unicode NFC, native digits to ASCII, zero-width characters removed
+    2. case folding, punctuation dropped by splitting into words
+    3. gazetteer entities replaced by their canonical name ("vizag" -> visakhapatnam)
+    4. politeness fillers removed
+    5. romanized words folded: long vowels, aspirates and doubled letters
+
+    python -m saanchari.normalize "Tell me about Vizag!"
+    python -m saanchari.normalize check     # golden cases in data/normalize_golden.tsv
+    python -m saanchari.normalize bench
+"""
+import re
+import sys
+import time
+import unicodedata
+
+from . import gazetteer, kb
+
+GOLDEN_PATH = kb.DATA_DIR / "normalize_golden.tsv"
+
+# ZWSP, ZWNJ, ZWJ, word joiner, BOM and soft hyphen change nothing a reader sees
+_INVISIBLE = dict.fromkeys(map(ord, "​‌‍⁠﻿­"))
+
+# Words that only make a question polite; interrogatives stay, they change the answer
+FILLERS = frozenset(
+    "a an the please pls kindly tell me about can could would you i want to know "
+    "కృపయా దయచేసి చెప్పండి చెప్పు గురించి "
+    "कृपया बताइए बताओ बताएं जानकारी".split()
+)
+
+# Applied in order to Latin words only: long vowels, then aspirates, then doubles
+_ROMAN_RULES = [
+    (re.compile(r"aa"), "a"),
+    (re.compile(r"ee|ii"), "i"),
+    (re.compile(r"oo|uu"), "u"),
+    (re.compile(r"([bcdgkpst])h"), r"\1"),
+    (re.compile(r"w"), "v"),
+    (re.compile(r"(.)\1+"), r"\1"),
+]
+
+
+def fold_roman(word):
+    """Collapse transliteration variants: pootharekulu, putharekulu -> putarekulu."""
+    if not word.isascii() or word.isdigit():
+        return word
+    for pattern, repl in _ROMAN_RULES:
+        word = pattern.sub(repl, word)
+    return word
+
+
+def _clean(text):
+    """Folded words joined by single spaces, so "Andhra-Pradesh!" reads as "andhra pradesh"."""
+    text = unicodedata.normalize("NFC", text).translate(_INVISIBLE)
+    if not text.isascii():
+        text = "".join(str(unicodedata.digit(ch)) if ch.isdigit() else ch for ch in text)
+    return " ".join(kb.words(text))
+
+
+def _segment_words(segment):
+    return [fold_roman(word) for word in segment.split() if word not in FILLERS]
+
+
+def normalize(text):
+    """Stable cache key for `text`."""
+    text = _clean(text)
+    tokens = []
+    pos = 0
+    for entity in gazetteer.extract(text):
+        tokens += _segment_words(text[pos:entity.start])
+        tokens.append("-".join(kb.words(entity.canonical)))
+        pos = entity.end
+    tokens += _segment_words(text[pos:])
+    return " ".join(tokens)
+
+
+def load_golden(path=GOLDEN_PATH):
+    groups = {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip() and not line.startswith("#"):
+            group, text = line.split("\t", 1)
+            groups.setdefault(group, []).append(text)
+    return groups
+
+
+def check(path=GOLDEN_PATH):
+    """Every variant in a group must share one key, and no two groups may collide."""
+    groups = load_golden(path)
+    failures = 0
+    owner = {}
+    for group, texts in groups.items():
+        keys = {normalize(text) for text in texts}
+        if len(keys) != 1:
+            failures += 1
+            print(f"  {group}: {len(keys)} keys")
+            for text in texts:
+                print(f"    {normalize(text)!r:<50} {text}")
+        for key in keys:
+            if owner.setdefault(key, group) != group:
+                failures += 1
+                print(f"  {group} collides with {owner[key]}: {key!r}")
+    total = sum(len(texts) for texts in groups.values())
+    print(f"{len(groups) - failures}/{len(groups)} groups stable ({total} variants)")
+    return not failures
+
+
+def bench(rounds=2000):
+    texts = [text for texts in load_golden().values() for text in texts]
+    normalize("warm up")
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            normalize(text)
+    elapsed = time.perf_counter() - started
+    raw = {" ".join(kb.words(text)) for text in texts}
+    keys = {normalize(text) for text in texts}
+    print(f"{elapsed / (rounds * len(texts)) * 1e6:.1f} us/question")
+    print(f"{len(texts)} variants -> {len(raw)} keys with plain word folding, {len(keys)} normalized")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["check"]:
+        sys.exit(0 if check() else 1)
+    if sys.argv[1:2] == ["bench"]:
+        bench()
+    else:
+        print(normalize(" ".join(sys.argv[1:])))
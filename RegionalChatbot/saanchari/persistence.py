@@ -0,0 +1,210 @@
+"""On-disk conversation store (SQLite, WAL mode) with batched background writes."""
+import queue
+import sqlite3
+import threading
+import time
+import weakref
+
+from . import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    conversation_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (conversation_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS usage (
+    day TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    model TEXT NOT NULL,
+    calls INTEGER NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    estimated INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    PRIMARY KEY (day, conversation_id, kind, model)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS usage_by_conversation ON usage (conversation_id);
+"""
+
+USAGE_UPSERT = """
+INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (day, conversation_id, kind, model) DO UPDATE SET
+    calls = calls + excluded.calls,
+    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+    output_tokens = output_tokens + excluded.output_tokens,
+    estimated = estimated + excluded.estimated,
+    cost = cost + excluded.cost
+"""
+
+# A message lands at the index its store gave it, unless another store (a second
+# tab on the same conversation) has written past it; then it goes after the last
+# message instead of replacing one
+MESSAGE_INSERT = """
+INSERT INTO messages
+SELECT ?1, MAX(?2, COALESCE((SELECT MAX(idx) + 1 FROM messages WHERE conversation_id = ?1), 0)), ?3, ?4, ?5
+"""
+
+_STOP = object()
+
+
+class _UsageRow(tuple):
+    pass
+
+
+class ConversationStore:
+    """Append-mostly message log keyed by conversation id.
+
+    Appends are queued and written by one background thread in batches, so the
+    request path never waits on disk. Reads use a per-thread connection; WAL
+    mode lets them run alongside the writer.
+    """
+
+    def __init__(self, path, batch_size=128, flush_interval=0.25):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.close()
+        self._writer = threading.Thread(target=self._write_loop, name="saanchari-db", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def append(self, conversation_id, index, role, content, created):
+        self._queue.put((conversation_id, index, role, content, created))
+
+    def add_usage(self, day, conversation_id, kind, model, calls, prompt_tokens, output_tokens,
+                  estimated, cost):
+        """Queue usage to be summed into the (day, conversation, kind, model) row."""
+        self._queue.put(_UsageRow((day, conversation_id, kind, model, calls, prompt_tokens,
+                                   output_tokens, estimated, cost)))
+
+    def flush(self, timeout=None):
+        """Block until every queued append has been committed."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._writer.join()
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            batch, usage, waiters, stop = [], [], [], False
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                elif isinstance(item, _UsageRow):
+                    usage.append(item)
+                else:
+                    batch.append(item)
+                if stop or waiters or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                started = time.perf_counter()
+                with conn:
+                    conn.executemany(MESSAGE_INSERT, batch)
+                metrics.incr("db.rows_written", len(batch))
+                metrics.observe("db.batch_seconds", time.perf_counter() - started)
+            if usage:
+                with conn:
+                    conn.executemany(USAGE_UPSERT, usage)
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                conn.close()
+                return
+
+    def count(self, conversation_id):
+        row = self._reader().execute(
+            "SELECT COALESCE(MAX(idx) + 1, 0) FROM messages WHERE conversation_id = ?",
+            (conversation_id,),
+        ).fetchone()
+        return row[0]
+
+    def session_usage(self, conversation_id):
+        """(tokens, cost) recorded for a conversation across all days.
+
+        Reads what has been committed, without waiting for queued usage rows.
+        """
+        row = self._reader().execute(
+            "SELECT COALESCE(SUM(prompt_tokens + output_tokens), 0), COALESCE(SUM(cost), 0) "
+            "FROM usage WHERE conversation_id = ?",
+            (conversation_id,),
+        ).fetchone()
+        return row[0], row[1]
+
+    def load(self, conversation_id, start=0, stop=None):
+        """Return (idx, role, content, created) rows with start <= idx < stop."""
+        if stop is None:
+            stop = 2**62
+        return self._reader().execute(
+            "SELECT idx, role, content, created FROM messages "
+            "WHERE conversation_id = ? AND idx >= ? AND idx < ? ORDER BY idx",
+            (conversation_id, start, stop),
+        ).fetchall()
+
+
+class SessionReaper:
+    """Offload idle sessions' messages to disk to reclaim memory.
+
+    Stores register themselves; a daemon thread periodically offloads any
+    store that has not been touched for `idle_seconds`. Offloaded stores
+    rehydrate lazily on their next access.
+    """
+
+    def __init__(self, idle_seconds=900, interval=60):
+        self.idle_seconds = idle_seconds
+        self.interval = interval
+        self._stores = weakref.WeakSet()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._loop, name="saanchari-reaper", daemon=True).start()
+
+    def register(self, store):
+        with self._lock:
+            self._stores.add(store)
+
+    def reap(self):
+        now = time.monotonic()
+        with self._lock:
+            stores = list(self._stores)
+        reaped = 0
+        for store in stores:
+            if now - store.last_access > self.idle_seconds and store.offload():
+                reaped += 1
+        if reaped:
+            metrics.incr("sessions.offloaded", reaped)
+        return reaped
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            self.reap()
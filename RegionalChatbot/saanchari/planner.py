@@ -0,0 +1,219 @@
+"""Split compound questions into independent parts answered concurrently.
+
+"Food, hotels and transport for Vizag, Tirupati and Srisailam" becomes one
+sub-question per place (or per topic, or per place and topic when that stays
+small). Each part is answered on its own, from the answer cache when it has
+been asked before, and the parts stream back as sections in question order:
+the first section streams live while later ones are generated alongside it
+and appear as soon as everything before them is done.
+
+Questions that relate places to each other ("Vizag to Araku", "compare",
+itineraries) are left whole, since the parts would not be independent.
+
+    python -m saanchari.planner "food, hotels and transport for Vizag, Tirupati and Srisailam"
+    python -m saanchari.planner bench
+"""
+import asyncio
+import re
+import sys
+import time
+
+from . import engine, gazetteer, kb, metrics
+from .cache import PLANNED
+from .prompts import build_prompt
+
+MAX_PARTS = 6
+
+# Topic -> words that ask for it (English, Telugu, Hindi)
+TOPICS = {
+    "Food": "food foods eat eating dishes cuisine restaurants ఆహారం భోజనం వంటకాలు खाना भोजन व्यंजन",
+    "Hotels": "hotel hotels stay accommodation resorts lodging హోటల్ హోటల్స్ వసతి होटल ठहरने",
+    "Transport": "transport transportation reach getting bus buses train trains flights airport రవాణా परिवहन",
+    "Temples": "temple temples ఆలయం ఆలయాలు గుడి मंदिर",
+    "Beaches": "beach beaches బీచ్ బీచ్‌లు बीच",
+    "Festivals": "festival festivals పండుగ పండుగలు त्योहार",
+    "Shopping": "shopping souvenirs markets handicrafts షాపింగ్ खरीदारी",
+    "Weather": "weather season climate వాతావరణం मौसम",
+}
+TOPIC_WORDS = {word: topic for topic, words in TOPICS.items() for word in kb.words(words)}
+
+TOPIC_QUESTIONS = {
+    "Food": "What food should I try in {place}, and where?",
+    "Hotels": "Where should I stay in {place}?",
+    "Transport": "How do I get to {place} and get around there?",
+    "Temples": "Which temples should I visit in {place}?",
+    "Beaches": "Which beaches should I visit in {place}?",
+    "Festivals": "Which festivals are celebrated in {place}?",
+    "Shopping": "What should I shop for in {place}?",
+    "Weather": "What is the weather like in {place} and when is the best time to visit?",
+}
+
+# Words that tie places together: the answer is one route, comparison or plan
+LINKING_WORDS = frozenset(
+    "to from between via vs versus compare comparison or itinerary plan trip route నుండి కి से तक".split()
+)
+
+UNAVAILABLE = "_This part could not be answered right now._"
+
+_END = object()
+
+
+class SubQuery:
+    __slots__ = ("title", "question")
+
+    def __init__(self, title, question):
+        self.title = title
+        self.question = question
+
+    def __repr__(self):
+        return f"SubQuery({self.title!r}, {self.question!r})"
+
+
+def _join(items):
+    return ", ".join(items[:-1]) + f" and {items[-1]}" if len(items) > 1 else "".join(items)
+
+
+def decompose(question):
+    """Independent sub-questions for a compound question, or [] to answer it whole."""
+    words = kb.words(question)
+    if LINKING_WORDS.intersection(words):
+        return []
+    places = list(dict.fromkeys(e.canonical for e in gazetteer.extract(question) if e.kind == "place"))
+    topics = list(dict.fromkeys(TOPIC_WORDS[w] for w in words if w in TOPIC_WORDS))
+    if len(places) >= 2 and topics and len(places) * len(topics) <= MAX_PARTS:
+        return [SubQuery(f"{topic} in {place}", TOPIC_QUESTIONS[topic].format(place=place))
+                for place in places for topic in topics]
+    if len(places) >= 2:
+        asked = _join([topic.lower() for topic in topics]) or "places to see, food and tips"
+        return [SubQuery(place, f"Tell me about {asked} in {place}.") for place in places[:MAX_PARTS]]
+    if len(topics) >= 2:
+        place = places[0] if places else "Andhra Pradesh"
+        return [SubQuery(topic, TOPIC_QUESTIONS[topic].format(place=place)) for topic in topics[:MAX_PARTS]]
+    return []
+
+
+def planned_answer(parts, models, cache, on_usage=None):
+    """GenerationJob `stream` answering each part with the model a ModelRouter picks for it.
+
+    `on_usage(model name, usage)` is called for every part that reached a model.
+    """
+
+    def answer_part(sub, token):
+        choice = models.choose(sub.question)
+        record = (lambda usage: on_usage(choice.name, usage)) if on_usage else None
+        return engine.stream_reply(choice.model, build_prompt(sub.question), token, record,
+                                   choice.generation_config)
+
+    return lambda token: section_stream(parts, lambda sub: answer_part(sub, token), cache)
+
+
+async def _pump(source, queue):
+    try:
+        async for text in source:
+            queue.put_nowait(text)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        queue.put_nowait(e)
+    finally:
+        queue.put_nowait(_END)
+
+
+async def stream_in_order(sources):
+    """Run async text streams concurrently, yielding their text one source after another.
+
+    A source that fails yields UNAVAILABLE in place of the rest of its text.
+    """
+    queues = [asyncio.Queue() for _ in sources]
+    tasks = [asyncio.ensure_future(_pump(source, queue)) for source, queue in zip(sources, queues)]
+    try:
+        for queue in queues:
+            while (item := await queue.get()) is not _END:
+                if isinstance(item, Exception):
+                    metrics.incr("planner.part_errors")
+                    yield f"\n\n{UNAVAILABLE}"
+                else:
+                    yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def section_stream(parts, answer_part, cache, lang="en"):
+    """Async text stream of `parts` as markdown sections.
+
+    `answer_part(sub)` returns an async iterator of one part's text; parts
+    already in `cache` are served from it and fresh answers are stored there.
+    """
+
+    async def one(index, sub):
+        yield f"{'' if index == 0 else chr(10) * 2}### {sub.title}\n\n"
+        cached = cache.get(sub.question, lang)
+        if cached is not None:
+            metrics.incr("planner.cached_parts")
+            yield cached
+            return
+        parts = []
+        async for text in answer_part(sub):
+            parts.append(text)
+            yield text
+        cache.put(sub.question, lang, "".join(parts).strip(), source=PLANNED)
+
+    metrics.incr("planner.decomposed")
+    metrics.incr("planner.parts", len(parts))
+    return stream_in_order([one(i, sub) for i, sub in enumerate(parts)])
+
+
+_HEADING = re.compile(r"\s*### [^\n]*\n\n")
+
+
+async def _timed(stream):
+    """(first answer text, first section complete, everything) in seconds.
+
+    Every fake answer starts with "### Highlights", so the second one marks the
+    end of the first section in both the single-shot and the decomposed stream.
+    """
+    started = time.perf_counter()
+    first_text = first_section = None
+    received = ""
+    async for text in stream:
+        now = time.perf_counter() - started
+        if first_text is None and not _HEADING.fullmatch(text):
+            first_text = now
+        received += text
+        if first_section is None and received.count("### Highlights") >= 2:
+            first_section = now
+    return first_text, first_section, time.perf_counter() - started
+
+
+async def _bench(question):
+    from .cache import AnswerCache
+    from .cancel import CancelToken
+    from .fakes import SAMPLE_ANSWER, FakeModel
+
+    stream_reply = engine.stream_reply
+
+    parts = decompose(question)
+    print(f"{question!r} -> {len(parts)} parts")
+    for sub in parts:
+        print(f"  {sub.title}: {sub.question}")
+    # Generation time grows with answer length; one answer covering every part is that much longer
+    whole = FakeModel(answer=SAMPLE_ANSWER * len(parts), first_token=0.4, chunk_delay=0.03)
+    part = FakeModel(answer=SAMPLE_ANSWER, first_token=0.4, chunk_delay=0.03)
+    runs = [("single shot", lambda: stream_reply(whole, question, CancelToken()))]
+    cache = AnswerCache()
+    for label in ("decomposed, cold", "decomposed, cached"):
+        runs.append((label, lambda: section_stream(
+            parts, lambda sub: stream_reply(part, sub.question, CancelToken()), cache)))
+    for label, stream in runs:
+        first_text, first_section, total = await _timed(stream())
+        print(f"{label:<19} first text {first_text * 1000:5.0f} ms  first section done "
+              f"{first_section * 1000:5.0f} ms  complete {total * 1000:5.0f} ms")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["bench"]:
+        asyncio.run(_bench(" ".join(sys.argv[2:]) or "food, hotels and transport for Vizag, Tirupati and Srisailam"))
+    else:
+        for sub in decompose(" ".join(sys.argv[1:])):
+            print(f"{sub.title:<28} {sub.question}")
@@ -0,0 +1,214 @@
+"""Which questions are hot right now, counted in bounded memory.
+
+A count-min sketch estimates how often each normalized question was asked,
+without storing the questions themselves; a small top-k table keeps the
+hottest ones with one example wording each. Counts halve every half-life,
+so the table follows what is being asked now rather than all time.
+
+The refresh scheduler (saanchari.refresh) uses these counts to answer the
+hottest questions ahead of time and to refresh their answers before expiry.
+
+    python -m saanchari.popular bench
+"""
+import array
+import heapq
+import os
+import random
+import sys
+import threading
+import time
+
+from .cache import cache_key
+from .langdetect import detect, needs_translation
+
+LANGUAGES = ("en", "hi", "te")
+
+SKETCH_WIDTH = 4096
+SKETCH_DEPTH = 4
+TOP_K = 50
+HALF_LIFE = float(os.getenv("SAANCHARI_POPULAR_HALF_LIFE", "3600"))
+
+
+class CountMinSketch:
+    """Approximate counts in `depth` rows of `width` counters; estimates never undercount."""
+
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.rows = [array.array("I", bytes(4 * width)) for _ in range(depth)]
+
+    def _cells(self, key):
+        h = hash(key)
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key, count=1):
+        """Count `key` (conservative update) and return its new estimate."""
+        cells = self._cells(key)
+        estimate = min(row[cell] for row, cell in zip(self.rows, cells)) + count
+        for row, cell in zip(self.rows, cells):
+            if row[cell] < estimate:
+                row[cell] = estimate
+        return estimate
+
+    def estimate(self, key):
+        return min(row[cell] for row, cell in zip(self.rows, self._cells(key)))
+
+    def halve(self, times=1):
+        for row in self.rows:
+            for i, value in enumerate(row):
+                if value:
+                    row[i] = value >> times
+
+    @property
+    def nbytes(self):
+        return sum(row.itemsize * len(row) for row in self.rows)
+
+
+class HotQuery:
+    __slots__ = ("key", "question", "count", "langs")
+
+    def __init__(self, key, question, count, lang):
+        self.key = key
+        self.question = question
+        self.count = count
+        self.langs = {lang}
+
+    def copy(self):
+        hot = HotQuery(self.key, self.question, self.count, None)
+        hot.langs = set(self.langs)
+        return hot
+
+    def __repr__(self):
+        return f"HotQuery({self.question!r}, count={self.count}, langs={sorted(self.langs)})"
+
+
+class PopularQueries:
+    """Count-min sketch over normalized questions plus a top-k table of the hottest."""
+
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH, k=TOP_K, half_life=HALF_LIFE,
+                 clock=time.monotonic):
+        self.k = k
+        self.half_life = half_life
+        self._clock = clock
+        self._sketch = CountMinSketch(width, depth)
+        self._top = {}
+        # Min-heap of (count, key); entries whose count is out of date are skipped
+        self._heap = []
+        self._decayed = clock()
+        self._lock = threading.Lock()
+
+    def _decay(self):
+        halvings = int((self._clock() - self._decayed) / self.half_life)
+        if halvings <= 0:
+            return
+        self._decayed += halvings * self.half_life
+        halvings = min(halvings, 32)
+        self._sketch.halve(halvings)
+        for key, hot in list(self._top.items()):
+            hot.count >>= halvings
+            if not hot.count:
+                del self._top[key]
+        self._heap = [(hot.count, key) for key, hot in self._top.items()]
+        heapq.heapify(self._heap)
+
+    def _coldest(self):
+        while self._heap:
+            count, key = self._heap[0]
+            hot = self._top.get(key)
+            if hot is not None and hot.count == count:
+                return hot
+            heapq.heappop(self._heap)
+        return None
+
+    def add(self, question, lang="en"):
+        """Count one asking of `question`, answered in `lang`."""
+        key = cache_key(question)
+        if not key:
+            return
+        with self._lock:
+            self._decay()
+            count = self._sketch.add(key)
+            hot = self._top.get(key)
+            if hot is None:
+                if len(self._top) >= self.k:
+                    coldest = self._coldest()
+                    if coldest.count >= count:
+                        return
+                    del self._top[coldest.key]
+                hot = self._top[key] = HotQuery(key, question, count, lang)
+            else:
+                hot.question = question
+                hot.count = count
+                hot.langs.add(lang)
+            heapq.heappush(self._heap, (count, key))
+            if len(self._heap) > 8 * self.k:
+                self._heap = [(h.count, k) for k, h in self._top.items()]
+                heapq.heapify(self._heap)
+
+    def estimate(self, question):
+        return self.estimate_key(cache_key(question))
+
+    def estimate_key(self, key):
+        """Recent count for a normalized question, e.g. an answer cache key."""
+        with self._lock:
+            self._decay()
+            return self._sketch.estimate(key)
+
+    def top(self, n=None):
+        """The hottest HotQuery entries, most asked first."""
+        with self._lock:
+            self._decay()
+            ranked = sorted(self._top.values(), key=lambda hot: -hot.count)
+            return [hot.copy() for hot in ranked[:n]]
+
+
+def serving_languages(question):
+    """Languages an answer to `question` can be served in.
+
+    English and romanized questions are answered in whichever language is
+    selected; native-script ones only in their own language.
+    """
+    detection = detect(question)
+    return (detection.lang,) if needs_translation(detection) else LANGUAGES
+
+
+queries = PopularQueries()
+
+
+def _bench(events=100_000, distinct=20_000, k=20, seed=3):
+    """Zipf-distributed question stream: sketch top-k against exact counting."""
+    rand = random.Random(seed)
+    questions = [f"question number {i} about place {i % 97}" for i in range(distinct)]
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(distinct)]
+    stream = rand.choices(questions, weights, k=events)
+    keys = {q: cache_key(q) for q in questions}
+
+    tracker = PopularQueries(k=TOP_K, half_life=float("inf"))
+    started = time.perf_counter()
+    for question in stream:
+        tracker.add(question)
+    elapsed = time.perf_counter() - started
+
+    exact = {}
+    for question in stream:
+        exact[keys[question]] = exact.get(keys[question], 0) + 1
+    true_top = {key for key, _ in sorted(exact.items(), key=lambda item: -item[1])[:k]}
+    found = tracker.top(k)
+    overlap = sum(1 for hot in found if hot.key in true_top)
+    errors = [hot.count - exact[hot.key] for hot in found]
+    exact_bytes = sum(sys.getsizeof(key) + 28 for key in exact) + sys.getsizeof(exact)
+
+    print(f"{events} questions, {distinct} distinct, Zipf s=1.1")
+    print(f"add: {elapsed / events * 1e6:.2f} us/question (includes normalization)")
+    print(f"top-{k} recall {overlap}/{k}, count overestimate max {max(errors)}, "
+          f"mean {sum(errors) / len(errors):.1f} (hottest asked {max(exact.values())} times)")
+    print(f"memory: sketch {tracker._sketch.nbytes // 1024} KiB fixed, "
+          f"exact counts {exact_bytes // 1024} KiB and growing with distinct questions")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["bench"]:
+        _bench()
+    else:
+        print(__doc__)
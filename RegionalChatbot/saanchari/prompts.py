@@ -0,0 +1,73 @@
+"""Prompt assembly: system prompt plus knowledge-base passages relevant to the question."""
+from . import kb, vectors
+
+SYSTEM_PROMPT = (
+    "You are Saanchari, an expert AI guide for Andhra Pradesh tourism, culture, and cuisine. "
+    "Provide detailed, helpful, and enthusiastic information about tourist destinations, food, culture, "
+    "transportation, accommodation, and travel tips for Andhra Pradesh. "
+    "Be conversational, friendly, and informative in your responses. "
+    "When discussing food, include regional specialties and where to find them. "
+    "IMPORTANT: Always format your responses as bullet points or numbered lists. Never use long paragraphs. "
+    "Use **bold formatting** for key points, place names, food items, and important information. "
+    "Structure your responses with clear headings and bullet points. "
+    "Make the text easy to scan and read quickly with short, concise bullet points."
+)
+
+GROUNDING_INSTRUCTIONS = (
+    "Answer from the reference passages below when they cover the question, "
+    "and keep the answer focused on what was asked. "
+    "Only fall back to general knowledge for details the passages do not cover."
+)
+
+BRIEF_INSTRUCTIONS = "Keep this answer brief: at most five short bullet points."
+
+# Passages retrieved per question
+TOP_K = 4
+# Minimum BM25 score / cosine similarity for a passage to count as relevant
+MIN_BM25 = 1.5
+MIN_COSINE = 0.2
+# Reciprocal-rank-fusion constant
+RRF_K = 60
+
+
+def retrieve_batch(questions, k=TOP_K):
+    """Top-k passages per question, fusing BM25 and dense rankings (reciprocal rank fusion)."""
+    lexical = kb.load_index()
+    passages = lexical.passages
+    dense = vectors.load_index().search_batch(questions, k * 2)
+    results = []
+    for question, dense_hits in zip(questions, dense):
+        fused = {}
+        bm25_hits = [p for score, p in lexical.search(question, k * 2) if score >= MIN_BM25]
+        for rank, passage in enumerate(bm25_hits):
+            fused[passage["id"]] = fused.get(passage["id"], 0.0) + 1 / (RRF_K + rank)
+        by_id = {p["id"]: p for p in bm25_hits}
+        for rank, (score, row) in enumerate(hit for hit in dense_hits if hit[0] >= MIN_COSINE):
+            passage = passages[row]
+            by_id[passage["id"]] = passage
+            fused[passage["id"]] = fused.get(passage["id"], 0.0) + 1 / (RRF_K + rank)
+        best = sorted(fused, key=fused.get, reverse=True)[:k]
+        results.append([by_id[passage_id] for passage_id in best])
+    return results
+
+
+def retrieve(question, k=TOP_K):
+    return retrieve_batch([question], k)[0]
+
+
+def format_reference(passages):
+    return "\n".join(f"[{i}] **{p['title']}**: {p['text']}" for i, p in enumerate(passages, 1))
+
+
+def build_prompt(question, passages=None, brief=False):
+    """Full model prompt for `question`, grounded in retrieved passages when any match."""
+    if passages is None:
+        passages = retrieve(question)
+    system = f"{SYSTEM_PROMPT}\n{BRIEF_INSTRUCTIONS}" if brief else SYSTEM_PROMPT
+    if not passages:
+        return f"{system}\n\nUser question: {question}"
+    return (
+        f"{system}\n{GROUNDING_INSTRUCTIONS}\n\n"
+        f"Reference passages:\n{format_reference(passages)}\n\n"
+        f"User question: {question}"
+    )
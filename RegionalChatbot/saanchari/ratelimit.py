@@ -0,0 +1,70 @@
+"""Token-bucket rate limiting for upstream model and translation calls."""
+import asyncio
+import os
+import threading
+import time
+
+# Model calls per second for the whole process, shared by live answers and background work
+UPSTREAM_RATE = float(os.getenv("SAANCHARI_UPSTREAM_RATE", "2"))
+UPSTREAM_BURST = 10
+# Background work only takes a token while this many are left for live answers
+BACKGROUND_HEADROOM = 3
+
+
+class TokenBucket:
+    """Allow `rate` calls per second on average, in bursts of up to `capacity`.
+
+    Callers that reserve tokens queue up in order: tokens may go negative, and
+    each caller waits for the debt it adds to be paid back.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def available(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def try_acquire(self, n=1, keep=0):
+        """Take `n` tokens if they are available right now, leaving at least `keep`."""
+        with self._lock:
+            self._refill()
+            if self._tokens - n >= keep:
+                self._tokens -= n
+                return True
+            return False
+
+    def reserve(self, n=1):
+        """Take `n` tokens now and return how many seconds to wait before using them."""
+        with self._lock:
+            self._refill()
+            self._tokens -= n
+            return max(0.0, -self._tokens / self.rate)
+
+    def take(self, n=1):
+        """Take `n` tokens without waiting; the debt this may leave is capped at one burst."""
+        with self._lock:
+            self._refill()
+            self._tokens = max(self._tokens - n, -self.capacity)
+
+    async def acquire(self, n=1):
+        delay = self.reserve(n)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+# Live answers take() tokens, so they are never delayed and only leave less for
+# background work, which uses try_acquire(keep=BACKGROUND_HEADROOM)
+upstream = TokenBucket(UPSTREAM_RATE, UPSTREAM_BURST)
@@ -0,0 +1,245 @@
+"""Refresh-ahead of cached answers, so popular answers do not expire on the request path.
+
+A background scheduler wakes every few seconds and collects work: cached
+model answers in the last REFRESH_SHARE of their TTL (or already expired), and hot
+questions with no answer cached yet in a language they can be served in.
+Each is ranked by popularity x staleness, recent asks from the
+PopularQueries sketch times the share of its TTL already used (1 for an
+answer not cached at all), and done hottest-stalest first.
+
+Model calls come out of the process-wide upstream TokenBucket that live
+answers also draw on: live answers always go through, and the scheduler
+only uses what they leave. Answers nobody is asking for are left to expire.
+
+    python -m saanchari.refresh bench
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+from . import engine, metrics
+from .cache import MODEL
+from .cancel import CancelToken
+from .langdetect import detect, needs_translation
+from .popular import LANGUAGES, queries, serving_languages
+from .prompts import build_prompt
+from .ratelimit import BACKGROUND_HEADROOM, upstream
+from .usage import ledger, today
+
+# Refresh once less than this share of an answer's TTL is left
+REFRESH_SHARE = 0.2
+# Recent asks below which an answer is left to expire
+MIN_POPULARITY = 2
+# Hot questions checked for answers missing in a language
+WARM_TOP = 20
+TICK = float(os.getenv("SAANCHARI_REFRESH_TICK", "5"))
+MAX_CONCURRENT = 2
+# A question whose refresh failed is not retried for this long
+RETRY_AFTER = 300.0
+
+
+class RefreshTask:
+    __slots__ = ("key", "question", "langs", "priority", "remaining")
+
+    def __init__(self, key, question):
+        self.key = key
+        self.question = question
+        self.langs = set()
+        self.priority = 0.0
+        # Seconds until the soonest of its answers expires (None when one is missing)
+        self.remaining = None
+
+    def __repr__(self):
+        return f"RefreshTask({self.question!r}, langs={sorted(self.langs)}, priority={self.priority:.1f})"
+
+
+class RefreshScheduler:
+    """Regenerates cached answers ahead of expiry, most popular and stalest first."""
+
+    def __init__(self, cache, models, tracker=queries, budget=upstream, headroom=BACKGROUND_HEADROOM,
+                 refresh_share=REFRESH_SHARE, min_popularity=MIN_POPULARITY, warm_top=WARM_TOP,
+                 concurrency=MAX_CONCURRENT, langs=LANGUAGES, usage=ledger):
+        self.cache = cache
+        self.models = models
+        self.tracker = tracker
+        self.budget = budget
+        self.headroom = headroom
+        self.refresh_share = refresh_share
+        self.min_popularity = min_popularity
+        self.warm_top = warm_top
+        self.concurrency = concurrency
+        self.langs = langs
+        self.usage = usage
+        self._running = {}
+        self._failed = {}
+
+    def plan(self, now=None):
+        """RefreshTasks due now, highest priority first."""
+        now = time.time() if now is None else now
+        tasks = {}
+
+        def add(key, question, lang, priority, remaining=None):
+            task = tasks.get(key)
+            if task is None:
+                task = tasks[key] = RefreshTask(key, question)
+            task.langs.add(lang)
+            task.priority = max(task.priority, priority)
+            if remaining is not None and (task.remaining is None or remaining < task.remaining):
+                task.remaining = remaining
+
+        for (key, lang), entry in self.cache.entries():
+            lifetime = entry.expires - entry.created
+            staleness = (now - entry.created) / lifetime if lifetime > 0 else 1.0
+            # KB text, planned sections and prefetches are not one model answer to the question
+            if entry.source != MODEL or entry.question is None or staleness < 1 - self.refresh_share:
+                continue
+            popularity = self.tracker.estimate_key(key)
+            if popularity >= self.min_popularity:
+                add(key, entry.question, lang, popularity * staleness, entry.expires - now)
+        for hot in self.tracker.top(self.warm_top):
+            if hot.count < self.min_popularity:
+                break
+            for lang in serving_languages(hot.question):
+                if lang in self.langs and self.cache.entry(hot.question, lang) is None:
+                    add(hot.key, hot.question, lang, float(hot.count))
+        return sorted(tasks.values(), key=lambda task: -task.priority)
+
+    def _fresh_english(self, task, now):
+        """A cached English answer the task's other languages can be translated from, else None."""
+        if "en" in task.langs or needs_translation(detect(task.question)):
+            return None
+        entry = self.cache.entry(task.question, "en")
+        return entry.text if entry is not None and entry.expires > now else None
+
+    async def refresh(self, task, english=None):
+        """Answer `task` once in English (unless given) and store it in each of its languages."""
+        question = task.question
+        if english is None:
+            detection = detect(question)
+            english_question = question
+            if needs_translation(detection):
+                english_question = await engine.translate_text(question, "en", src=detection.lang)
+            choice = self.models.choose(english_question)
+
+            def record(usage):
+                self.usage.record(f"refresh-{today()}", "refresh", choice.name, usage)
+
+            english = await engine.generate_reply(choice.model, build_prompt(english_question), CancelToken(),
+                                                  None, record, choice.generation_config)
+            metrics.incr("refresh.model_calls")
+        for lang in sorted(task.langs, key=lambda lang: lang != "en"):
+            text = english if lang == "en" else await engine.translate_text(english, lang, src="en")
+            self.cache.put(question, lang, text, source=MODEL)
+            metrics.incr("refresh.answers")
+        if task.remaining is not None:
+            # How long before expiry the answer was replaced; negative means it had already expired
+            metrics.observe("refresh.ahead_seconds", max(task.remaining, 0.0))
+            if task.remaining < 0:
+                metrics.incr("refresh.late")
+
+    async def _refresh_logged(self, task, english):
+        try:
+            await self.refresh(task, english)
+        except Exception:
+            metrics.incr("refresh.errors")
+            self._failed[task.key] = time.monotonic() + RETRY_AFTER
+
+    def run_once(self):
+        """Start the highest-priority due tasks that the concurrency limit and shared budget allow.
+
+        Must be called on the event loop; returns how many tasks were started.
+        """
+        self._running = {key: future for key, future in self._running.items() if not future.done()}
+        self._failed = {key: until for key, until in self._failed.items() if until > time.monotonic()}
+        now = time.time()
+        started = 0
+        for task in self.plan(now):
+            if len(self._running) >= self.concurrency:
+                break
+            if task.key in self._running or task.key in self._failed:
+                continue
+            english = self._fresh_english(task, now)
+            if english is None and not self.budget.try_acquire(keep=self.headroom):
+                metrics.incr("refresh.skipped.budget")
+                break
+            self._running[task.key] = asyncio.ensure_future(self._refresh_logged(task, english))
+            started += 1
+        return started
+
+    async def run(self, tick=TICK):
+        while True:
+            self.run_once()
+            await asyncio.sleep(tick)
+
+    def start(self, loop=None):
+        """Run the scheduler forever on the engine's background loop."""
+        asyncio.run_coroutine_threadsafe(self.run(), loop or engine.get_loop())
+        return self
+
+
+async def _bench(seconds=20.0, ttl=5.0, rate=20, questions=40, calls_per_second=10, seed=5):
+    """Live traffic over a short TTL, with and without the scheduler, sharing one model budget."""
+    from .cache import AnswerCache
+    from .fakes import FakeModel
+    from .models import ModelRouter
+    from .popular import PopularQueries
+    from .ratelimit import TokenBucket
+    from .usage import UsageLedger
+
+    rand = random.Random(seed)
+    pool = [f"What is special about stop {i} on the Araku trip?" for i in range(questions)]
+    weights = [1 / (rank + 1) for rank in range(questions)]
+    arrivals = [(i / rate, rand.choices(pool, weights)[0]) for i in range(int(seconds * rate))]
+
+    async def run(schedule):
+        metrics.registry.reset()
+        cache = AnswerCache(ttl=ttl)
+        tracker = PopularQueries(half_life=float("inf"))
+        models = ModelRouter(lambda name: FakeModel(first_token=0.3, model_name=name))
+        budget = TokenBucket(calls_per_second, calls_per_second)
+        scheduler = RefreshScheduler(cache, models, tracker, budget, refresh_share=0.3, concurrency=4,
+                                     langs=("en",), usage=UsageLedger())
+        task = asyncio.ensure_future(scheduler.run(tick=0.25)) if schedule else None
+        waits = []
+        expired = [0]
+        live_calls = [0]
+
+        async def ask(at, question):
+            await asyncio.sleep(at)
+            tracker.add(question)
+            started = time.perf_counter()
+            entry = cache.entry(question, "en")
+            if cache.get(question, "en") is None:
+                if entry is not None and at > ttl:
+                    expired[0] += 1
+                budget.take()
+                live_calls[0] += 1
+                choice = models.choose(question)
+                cache.put(question, "en", await engine.generate_reply(choice.model, question, CancelToken()),
+                          source=MODEL)
+            if at > ttl:
+                waits.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(ask(at, question) for at, question in arrivals))
+        if task is not None:
+            task.cancel()
+        waits.sort()
+        return waits, expired[0], live_calls[0], metrics.registry.get("refresh.model_calls")
+
+    print(f"{len(arrivals)} questions over {seconds:.0f} s ({questions} distinct, Zipf), TTL {ttl:.0f} s, "
+          f"{calls_per_second} model calls/s shared; after the first TTL:")
+    for label, schedule in (("expire lazily", False), ("refresh-ahead", True)):
+        waits, expired, live_calls, refresh_calls = await run(schedule)
+        slow = sum(1 for wait in waits if wait > 0.05)
+        print(f"{label:<14} expired on request {expired:3d}, slow answers {slow:3d}/{len(waits)}, "
+              f"p99 wait {waits[int(len(waits) * 0.99)] * 1000:4.0f} ms, model calls live {live_calls}, "
+              f"refresh {refresh_calls}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["bench"]:
+        asyncio.run(_bench())
+    else:
+        print(__doc__)
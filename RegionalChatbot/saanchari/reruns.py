@@ -0,0 +1,100 @@
+"""Full script runs and server CPU each question costs in app.py.
+
+The app is driven with streamlit.testing AppTest against FakeModel, so it
+needs neither an API key nor network. Each question is a quick-start button
+click, with the answer cache cleared so it reaches the model, after which
+the chat fragment is polled until the answer is finished.
+
+Two versions of the app are measured: app.py as it is, where the button's
+on_click callback records the question and the run it triggers starts the
+answer, and app.py with the button swapped back to the old handler that
+records the question in the script body and calls st.rerun().
+
+AppTest cannot rerun a fragment on its own, so each poll is a script run
+made by the harness; those are not counted as full runs, since a browser
+makes them as fragment runs. CPU is the thread time of every run, polls
+included, divided by the number of questions.
+
+    python -m saanchari.reruns bench
+"""
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from . import metrics
+from .cache import answers
+
+APP = Path(__file__).parent.parent / "app.py"
+
+# The quick-start button as app.py declares it, trailing spaces and all
+CALLBACK_BUTTON = re.compile(
+    r"        st\.button\(\s*question,\s*key=f\"q_\{i\}\",\s*use_container_width=True,\s*"
+    r"help=f\"Ask: \{question\}\",\s*on_click=submit_question,\s*args=\(question,\)\s*\)\n"
+)
+
+RERUN_BUTTON = '''\
+        if st.button(
+            question,
+            key=f"q_{i}",
+            use_container_width=True,
+            help=f"Ask: {question}"
+        ):
+            submit_question(question)
+            st.rerun()
+'''
+
+
+def rerun_source():
+    """app.py with the quick-start buttons submitting through st.rerun() as they used to."""
+    source = APP.read_text(encoding="utf-8")
+    source, found = CALLBACK_BUTTON.subn(lambda match: RERUN_BUTTON, source)
+    if found != 1:
+        raise RuntimeError("quick-start button not found in app.py; update CALLBACK_BUTTON")
+    return source
+
+
+def _ask(app, button):
+    """Click `button` and poll until answered; returns the script runs made by the harness."""
+    answers.clear()
+    app.button(key=button).click().run()
+    polls = 0
+    while app.session_state.job is not None:
+        time.sleep(0.05)
+        app.run()
+        polls += 1
+    return polls
+
+
+def _bench(questions=6):
+    import google.generativeai as genai
+    from streamlit.testing.v1 import AppTest
+
+    from .fakes import FakeModel
+
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    os.environ["SAANCHARI_DB"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["SAANCHARI_PREFETCH_PER_ANSWER"] = "0"
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = lambda name: FakeModel(first_token=0.05, chunk_delay=0.005, model_name=name)
+
+    print(f"{questions} quick-start questions, FakeModel")
+    for label, app in (("st.rerun() in the button handler", AppTest.from_string(rerun_source(), default_timeout=30)),
+                       ("on_click callback", AppTest.from_file(str(APP), default_timeout=30))):
+        app.run()
+        metrics.registry.reset()
+        polls = sum(_ask(app, f"q_{i % 3}") for i in range(questions))
+        full = metrics.registry.get("script.runs") - polls
+        cpu = metrics.registry.histogram("script.cpu_seconds")
+        print(f"{label:<34} {full / questions:.1f} full runs per question, "
+              f"{cpu['mean'] * cpu['count'] * 1000 / questions:5.1f} ms CPU per question "
+              f"({polls / questions:.1f} polls)")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["bench"]:
+        _bench()
+    else:
+        print(__doc__)
@@ -0,0 +1,243 @@
+"""Local intent router that decides how each question should be answered.
+
+Routes, cheapest first:
+    canned    greetings, thanks, goodbyes: answered from templates
+    offtopic  clearly unrelated to travel or Andhra Pradesh: polite redirect
+    faq       an answer for the same question is already cached
+    kb        short lookup that one knowledge-base passage clearly answers
+    llm       everything else goes to the model
+
+    python -m saanchari.router eval     # accuracy and latency on data/intents.tsv
+"""
+import sys
+import time
+from pathlib import Path
+
+from . import gazetteer, kb, metrics
+from .cache import answers
+
+CANNED = "canned"
+OFFTOPIC = "offtopic"
+FAQ = "faq"
+KB = "kb"
+LLM = "llm"
+
+LABELS_PATH = kb.DATA_DIR / "intents.tsv"
+
+KEYWORDS = {
+    "greeting": [
+        "hi", "hii", "hello", "hey", "hola", "namaste", "namaskaram", "namaskar",
+        "good morning", "good afternoon", "good evening", "vanakkam",
+        "నమస్కారం", "నమస్తే", "హలో", "హాయ్", "शुभ प्रभात", "नमस्ते", "नमस्कार", "हेलो",
+    ],
+    "thanks": [
+        "thanks", "thank you", "thank u", "thx", "ty", "dhanyavad", "dhanyavadalu",
+        "shukriya", "ధన్యవాదాలు", "థాంక్స్", "धन्यवाद", "शुक्रिया", "great", "awesome",
+        "ok", "okay", "cool", "nice",
+    ],
+    "goodbye": [
+        "bye", "goodbye", "see you", "good night", "tata", "vellostanu",
+        "సెలవు", "బై", "अलविदा", "फिर मिलेंगे",
+    ],
+    "travel": [
+        "visit", "travel", "trip", "tour", "tourist", "tourism", "place", "places",
+        "temple", "beach", "food", "eat", "dish", "hotel", "stay", "resort", "train",
+        "bus", "flight", "airport", "itinerary", "festival", "culture", "history",
+        "weather", "season", "darshan", "trek", "waterfall", "cave", "caves", "sightseeing",
+        "andhra", "pradesh", "ap", "telugu", "restaurant", "cuisine", "sweet", "shopping",
+        "ఆంధ్రప్రదేశ్", "పర్యటన", "ఆలయం", "ఆహారం", "పండుగ", "ప్రయాణం",
+        "आंध्र", "प्रदेश", "यात्रा", "मंदिर", "खाना", "त्योहार", "घूमने",
+    ],
+    "offtopic": [
+        "python", "javascript", "code", "program", "programming", "bitcoin", "crypto",
+        "stock", "stocks", "share price", "election", "politics", "cricket score",
+        "movie", "movies", "song lyrics", "homework", "math", "equation", "recipe for cake",
+        "joke", "poem", "essay", "translate this", "loan", "insurance",
+    ],
+}
+
+CANNED_REPLIES = {
+    "greeting": {
+        "en": "Namaskaram! 🙏 I'm **Saanchari**, your guide to **Andhra Pradesh**. Ask me about places to visit, food, festivals or how to get around.",
+        "hi": "नमस्ते! 🙏 मैं **सांचारी** हूँ, **आंध्र प्रदेश** के लिए आपकी गाइड। घूमने की जगहों, खाने, त्योहारों या यात्रा के बारे में पूछिए।",
+        "te": "నమస్కారం! 🙏 నేను **సాంచారి**, **ఆంధ్రప్రదేశ్** పర్యటనకు మీ గైడ్. చూడవలసిన ప్రదేశాలు, ఆహారం, పండుగలు లేదా ప్రయాణం గురించి అడగండి.",
+    },
+    "thanks": {
+        "en": "You're welcome! 😊 Anything else you'd like to know about **Andhra Pradesh**?",
+        "hi": "आपका स्वागत है! 😊 **आंध्र प्रदेश** के बारे में और कुछ जानना चाहेंगे?",
+        "te": "మీకు స్వాగతం! 😊 **ఆంధ్రప్రదేశ్** గురించి ఇంకా ఏమైనా తెలుసుకోవాలనుకుంటున్నారా?",
+    },
+    "goodbye": {
+        "en": "Have a wonderful trip! 🌴 Come back any time you need help exploring **Andhra Pradesh**.",
+        "hi": "आपकी यात्रा शुभ हो! 🌴 **आंध्र प्रदेश** घूमने में मदद चाहिए तो फिर आइए।",
+        "te": "మీ ప్రయాణం శుభంగా సాగాలి! 🌴 **ఆంధ్రప్రదేశ్** పర్యటనకు సహాయం కావాలంటే మళ్లీ రండి.",
+    },
+    "offtopic": {
+        "en": "I'm **Saanchari**, and I can only help with **Andhra Pradesh** tourism, culture and food. Try asking about temples, beaches, dishes or trip plans!",
+        "hi": "मैं **सांचारी** हूँ और केवल **आंध्र प्रदेश** पर्यटन, संस्कृति और खाने के बारे में मदद कर सकती हूँ। मंदिरों, समुद्र तटों, व्यंजनों या यात्रा योजना के बारे में पूछिए!",
+        "te": "నేను **సాంచారి**, **ఆంధ్రప్రదేశ్** పర్యాటకం, సంస్కృతి మరియు ఆహారం గురించి మాత్రమే సహాయం చేయగలను. ఆలయాలు, బీచ్‌లు, వంటకాలు లేదా పర్యటన ప్రణాళికల గురించి అడగండి!",
+    },
+}
+
+# Words that neither add nor remove meaning from a pleasantry ("hey there", "thanks a lot")
+FILLERS = frozenset("there so much lot very all guys sir madam bro friend dear again once a".split())
+# A short message must be mostly pleasantries to be answered from a template
+CANNED_MAX_WORDS = 6
+CANNED_MIN_COVERAGE = 0.6
+
+
+class KeywordTrie:
+    """Trie over word sequences; finds the longest keyword at each position."""
+
+    def __init__(self):
+        self._root = {}
+
+    def add(self, phrase, label):
+        node = self._root
+        for word in kb.words(phrase):
+            node = node.setdefault(word, {})
+        node[None] = label
+
+    def matches(self, tokens):
+        """Yield (label, length) for longest non-overlapping matches, left to right."""
+        i = 0
+        while i < len(tokens):
+            node, best, j = self._root, None, i
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if None in node:
+                    best = (node[None], j - i)
+            if best:
+                yield best
+                i += best[1]
+            else:
+                i += 1
+
+
+def _build_tries():
+    keywords = KeywordTrie()
+    for label, phrases in KEYWORDS.items():
+        for phrase in phrases:
+            keywords.add(phrase, label)
+    # Every place, dish and festival the knowledge base knows is a travel signal
+    entities = KeywordTrie()
+    for doc, passage in enumerate(kb.load_index().passages):
+        for alias in [passage["title"], *passage.get("aliases", [])]:
+            keywords.add(alias, "travel")
+            entities.add(alias, doc)
+    return keywords, entities
+
+
+_tries = None
+
+
+def get_tries():
+    global _tries
+    if _tries is None:
+        _tries = _build_tries()
+    return _tries
+
+
+def _entity_lookup(tokens):
+    """The one passage a bare entity query ("what is pootharekulu?") names, else None."""
+    matches = list(get_tries()[1].matches(tokens))
+    covered = sum(length for _, length in matches)
+    docs = {doc for doc, _ in matches}
+    uncovered = sum(1 for word in tokens if word not in kb.STOPWORDS) - covered
+    if len(docs) == 1 and uncovered <= 0:
+        return kb.load_index().passages[docs.pop()]
+    return None
+
+
+class Decision:
+    __slots__ = ("route", "intent", "reply", "passage")
+
+    def __init__(self, route, intent=None, reply=None, passage=None):
+        self.route = route
+        self.intent = intent
+        self.reply = reply
+        self.passage = passage
+
+    def __repr__(self):
+        return f"Decision({self.route!r}, intent={self.intent!r})"
+
+
+def classify(question, lang="en", cache=None):
+    """Pick a route for `question` without any network call."""
+    tokens = kb.words(question)
+    scores = {}
+    for label, length in get_tries()[0].matches(tokens):
+        scores[label] = scores.get(label, 0) + length
+    # Gazetteer names also catch spellings and inflections the KB aliases miss ("తిరుపతిలో")
+    entities = gazetteer.extract(question)
+    if entities:
+        scores["travel"] = scores.get("travel", 0) + len(entities)
+
+    pleasantries = {label: scores.get(label, 0) for label in ("greeting", "thanks", "goodbye")}
+    top = max(pleasantries, key=pleasantries.get)
+    meaningful = sum(1 for word in tokens if word not in FILLERS)
+    if (
+        pleasantries[top]
+        and len(tokens) <= CANNED_MAX_WORDS
+        and sum(pleasantries.values()) / max(meaningful, 1) >= CANNED_MIN_COVERAGE
+        and not scores.get("travel")
+    ):
+        return Decision(CANNED, top, CANNED_REPLIES[top].get(lang, CANNED_REPLIES[top]["en"]))
+
+    if scores.get("offtopic") and not scores.get("travel"):
+        return Decision(OFFTOPIC, "offtopic", CANNED_REPLIES["offtopic"].get(lang, CANNED_REPLIES["offtopic"]["en"]))
+
+    cached = (answers if cache is None else cache).get(question, lang)
+    if cached is not None:
+        return Decision(FAQ, "faq", cached)
+
+    passage = _entity_lookup(tokens)
+    if passage is not None:
+        return Decision(KB, "lookup", f"### {passage['title']}\n\n{passage['text']}", passage)
+
+    return Decision(LLM, "question")
+
+
+def route(question, lang="en", cache=None):
+    """classify() plus routing metrics."""
+    started = time.perf_counter()
+    decision = classify(question, lang, cache)
+    metrics.observe("router.seconds", time.perf_counter() - started)
+    metrics.incr(f"router.route.{decision.route}")
+    return decision
+
+
+def load_labels(path=LABELS_PATH):
+    rows = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if line.strip() and not line.startswith("#"):
+            text, label = line.rsplit("\t", 1)
+            rows.append((text, label.strip()))
+    return rows
+
+
+def evaluate(path=LABELS_PATH):
+    from .cache import AnswerCache
+
+    rows = load_labels(path)
+    empty = AnswerCache()
+    classify("warm up", cache=empty)
+    wrong = []
+    started = time.perf_counter()
+    for text, label in rows:
+        got = classify(text, cache=empty).route
+        if got != label:
+            wrong.append((text, label, got))
+    elapsed = time.perf_counter() - started
+    print(f"{len(rows) - len(wrong)}/{len(rows)} correct ({1 - len(wrong) / len(rows):.1%}), "
+          f"{elapsed / len(rows) * 1e6:.1f} us/question")
+    for text, label, got in wrong:
+        print(f"  expected {label:<8} got {got:<8} {text}")
+    return not wrong
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["eval"]:
+        sys.exit(0 if evaluate() else 1)
+    print(__doc__)
@@ -0,0 +1,223 @@
+"""Compact, memory-bounded message storage for chat sessions."""
+import sys
+import threading
+import time
+import zlib
+
+from . import metrics
+
+# Newest messages kept as plain text; older ones are compressed
+HOT_MESSAGES = 20
+# Messages shorter than this are not worth compressing
+MIN_COMPRESS_CHARS = 200
+# Default per-session cap on message storage
+MAX_SESSION_BYTES = 512 * 1024
+
+SESSION_BYTE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 5e6)
+
+_ROLES = {}
+
+
+def _intern_role(role):
+    return _ROLES.setdefault(role, sys.intern(role))
+
+
+class Message:
+    """One chat message; behaves like the {"role", "content"} dicts it replaces."""
+
+    __slots__ = ("role", "created", "_data")
+
+    def __init__(self, role, content, created=None):
+        self.role = _intern_role(role)
+        self.created = created or time.time()
+        self._data = content
+
+    @property
+    def content(self):
+        data = self._data
+        if isinstance(data, bytes):
+            return zlib.decompress(data).decode()
+        return data
+
+    @property
+    def compressed(self):
+        return isinstance(self._data, bytes)
+
+    def compress(self):
+        """Store the text zlib-compressed if that actually saves space."""
+        data = self._data
+        if isinstance(data, bytes) or len(data) < MIN_COMPRESS_CHARS:
+            return
+        packed = zlib.compress(data.encode(), 6)
+        if sys.getsizeof(packed) < sys.getsizeof(data):
+            self._data = packed
+
+    def nbytes(self):
+        return sys.getsizeof(self) + sys.getsizeof(self.created) + sys.getsizeof(self._data)
+
+    def __getitem__(self, key):
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.content[:40]!r})"
+
+
+class MessageStore:
+    """Append-only transcript with compressed cold messages and a byte cap.
+
+    Indices are logical: they keep counting from the first message of the
+    session even after old messages have been evicted, so ids derived from
+    them stay stable. `first_index` is the oldest index held in memory.
+
+    With a `backend` (a ConversationStore) every message is also persisted
+    under `conversation_id`; evicted messages are then read back from disk on
+    demand instead of being lost, and the whole store can be offloaded while
+    the session is idle.
+    """
+
+    def __init__(self, max_bytes=MAX_SESSION_BYTES, hot=HOT_MESSAGES,
+                 conversation_id=None, backend=None):
+        self.max_bytes = max_bytes
+        self.hot = hot
+        self.conversation_id = conversation_id
+        self.backend = backend
+        self.first_index = 0
+        self.last_access = time.monotonic()
+        self._messages = []
+        self._bytes = 0
+        self._offloaded = False
+        self._lock = threading.RLock()
+
+    @classmethod
+    def restore(cls, conversation_id, backend, **kwargs):
+        """Reattach to a persisted conversation; messages are loaded lazily."""
+        store = cls(conversation_id=conversation_id, backend=backend, **kwargs)
+        # Messages an earlier run of this tab added may still be waiting in the write queue
+        backend.flush()
+        store.first_index = backend.count(conversation_id)
+        store._offloaded = True
+        return store
+
+    @property
+    def oldest_index(self):
+        """Oldest index that can still be read, from memory or disk."""
+        return 0 if self.backend is not None else self.first_index
+
+    def _touch(self):
+        self.last_access = time.monotonic()
+        if self._offloaded:
+            self._rehydrate()
+
+    def _rehydrate(self):
+        """Load the hot tail of an offloaded conversation back into memory."""
+        total = self.first_index
+        start = max(0, total - self.hot)
+        self._messages = [
+            Message(role, content, created)
+            for _, role, content, created in self.backend.load(self.conversation_id, start, total)
+        ]
+        self.first_index = total - len(self._messages)
+        self._bytes = sum(m.nbytes() for m in self._messages)
+        self._offloaded = False
+        metrics.incr("sessions.rehydrated")
+
+    def offload(self):
+        """Drop every in-memory message of a persisted store; returns True if done."""
+        with self._lock:
+            if self.backend is None or self._offloaded:
+                return False
+            self.backend.flush()
+            self.first_index += len(self._messages)
+            self._messages = []
+            self._bytes = 0
+            self._offloaded = True
+            return True
+
+    def add(self, role, content):
+        with self._lock:
+            self._touch()
+            message = Message(role, content)
+            if self.backend is not None:
+                self.backend.append(
+                    self.conversation_id, len(self), message.role, content, message.created
+                )
+            self._messages.append(message)
+            self._bytes += message.nbytes()
+            if len(self._messages) > self.hot:
+                cold = self._messages[-self.hot - 1]
+                before = cold.nbytes()
+                cold.compress()
+                self._bytes += cold.nbytes() - before
+            self._enforce_cap()
+            metrics.observe("session.bytes", self._bytes, buckets=SESSION_BYTE_BUCKETS)
+            return message
+
+    def _enforce_cap(self):
+        """Evict the oldest cold messages until the session fits its cap."""
+        evicted = 0
+        while self._bytes > self.max_bytes and len(self._messages) > self.hot:
+            self._bytes -= self._messages.pop(0).nbytes()
+            self.first_index += 1
+            evicted += 1
+        if evicted:
+            metrics.incr("store.evicted", evicted)
+        return evicted
+
+    def last(self):
+        """The newest message, or None, read without marking the session as active."""
+        with self._lock:
+            if self._messages:
+                return self._messages[-1]
+            if self.backend is not None and len(self):
+                return self._from_disk(len(self) - 1, len(self))[0]
+            return None
+
+    def _from_disk(self, start, stop):
+        # Evicted messages may still be waiting in the write queue
+        self.backend.flush()
+        rows = self.backend.load(self.conversation_id, start, stop)
+        metrics.incr("store.disk_reads")
+        return [Message(role, content, created) for _, role, content, created in rows]
+
+    def nbytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return self.first_index + len(self._messages)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        with self._lock:
+            self._touch()
+            return iter(list(self._messages))
+
+    def __getitem__(self, index):
+        with self._lock:
+            self._touch()
+            if isinstance(index, slice):
+                start, stop, step = index.indices(len(self))
+                older = []
+                if start < self.first_index and self.backend is not None:
+                    older = self._from_disk(start, min(stop, self.first_index))
+                start = max(start, self.first_index) - self.first_index
+                stop = max(stop, self.first_index) - self.first_index
+                return (older + self._messages[start:stop])[::step]
+            if index < 0:
+                index += len(self)
+            if index < self.first_index:
+                if self.backend is not None and index >= 0:
+                    return self._from_disk(index, index + 1)[0]
+                raise IndexError("message evicted from memory")
+            return self._messages[index - self.first_index]
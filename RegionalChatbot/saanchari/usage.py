@@ -0,0 +1,198 @@
+"""Token and cost accounting per session, per question type and per day, with session budgets.
+
+Token counts come from the response's usage_metadata when Gemini reports it,
+otherwise from a local estimate. Totals are kept in memory for budget checks
+and, when a ConversationStore is attached, summed into its `usage` table.
+
+    python -m saanchari.usage report saanchari_conversations.db
+"""
+import datetime
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from . import metrics
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+# USD per million (prompt, output) tokens
+PRICES = {
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-flash-8b": (0.0375, 0.15),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+}
+
+# Tokens a session may spend before answers get shorter, and before the model is skipped
+SESSION_TOKEN_BUDGET = int(os.getenv("SAANCHARI_SESSION_TOKEN_BUDGET", "60000"))
+SOFT_BUDGET_SHARE = float(os.getenv("SAANCHARI_SOFT_BUDGET_SHARE", "0.75"))
+
+# Answer plans, most to least expensive
+FULL = "full"
+SHORT = "short"
+LOCAL = "local"
+
+SHORT_OUTPUT_TOKENS = 400
+
+# Session totals unused for this long are dropped from memory (and reloaded from the backend)
+SESSION_IDLE_SECONDS = 3600
+
+# Gemini bills an image in a prompt as a fixed number of tokens per 768 px tile
+IMAGE_TOKENS = 258
+
+
+def estimate_tokens(text):
+    """Rough Gemini token count: ~4 characters per token in Latin script, ~1.5 in Indic scripts."""
+    ascii_chars = sum(1 for ch in text if ch < "\x80")
+    return round(ascii_chars / 4 + (len(text) - ascii_chars) / 1.5)
+
+
+def estimate_prompt_tokens(prompt):
+    """estimate_tokens() for a text prompt or a multimodal list of text and image parts."""
+    if isinstance(prompt, str):
+        return estimate_tokens(prompt)
+    return sum(estimate_tokens(part) if isinstance(part, str) else IMAGE_TOKENS for part in prompt)
+
+
+class Usage:
+    __slots__ = ("prompt_tokens", "output_tokens", "estimated")
+
+    def __init__(self, prompt_tokens=0, output_tokens=0, estimated=False):
+        self.prompt_tokens = prompt_tokens
+        self.output_tokens = output_tokens
+        self.estimated = estimated
+
+    @classmethod
+    def from_metadata(cls, metadata, prompt, text):
+        """Usage reported by the API, or estimated from the prompt and answer text."""
+        prompt_tokens = getattr(metadata, "prompt_token_count", 0) if metadata is not None else 0
+        if prompt_tokens:
+            return cls(prompt_tokens, getattr(metadata, "candidates_token_count", 0) or 0)
+        return cls(estimate_prompt_tokens(prompt), estimate_tokens(text), estimated=True)
+
+    @property
+    def total(self):
+        return self.prompt_tokens + self.output_tokens
+
+    def cost(self, model=DEFAULT_MODEL):
+        prompt_price, output_price = PRICES.get(model, PRICES[DEFAULT_MODEL])
+        return (self.prompt_tokens * prompt_price + self.output_tokens * output_price) / 1e6
+
+    def __repr__(self):
+        return f"Usage({self.prompt_tokens}, {self.output_tokens}, estimated={self.estimated})"
+
+
+def today():
+    return datetime.date.today().isoformat()
+
+
+class UsageLedger:
+    """Process-wide usage totals keyed by (day, session, question type, model).
+
+    Only the current day's rows stay in memory; earlier days live in the
+    backend. Session totals idle for `idle_seconds` are dropped too when there
+    is a backend to reload them from.
+    """
+
+    def __init__(self, backend=None, idle_seconds=SESSION_IDLE_SECONDS, clock=time.monotonic):
+        self.backend = backend
+        self.idle_seconds = idle_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._rows = {}
+        # session -> [tokens, cost, last used]
+        self._sessions = {}
+        self._day = None
+        self._swept = clock()
+
+    def record(self, session, kind, model, usage=None, day=None):
+        """Count one answer; `usage` is None for answers that made no model call."""
+        usage = usage or Usage()
+        model = (model or "").removeprefix("models/")
+        day = day or today()
+        key = (day, session, kind, model)
+        cost = usage.cost(model) if usage.total else 0.0
+        row = (1, usage.prompt_tokens, usage.output_tokens, int(usage.estimated), cost)
+        totals = self._session_totals(session)
+        with self._lock:
+            if day != self._day:
+                self._day = day
+                self._rows = {k: v for k, v in self._rows.items() if k[0] >= day}
+            old = self._rows.get(key, (0, 0, 0, 0, 0.0))
+            self._rows[key] = tuple(a + b for a, b in zip(old, row))
+            totals[0] += usage.total
+            totals[1] += cost
+        if self.backend is not None and session:
+            self.backend.add_usage(*key, *row)
+        metrics.incr(f"usage.tokens.{kind}", usage.total)
+        if usage.estimated:
+            metrics.incr("usage.estimated_calls")
+
+    def _session_totals(self, session):
+        """The session's [tokens, cost, last used]; earlier usage is read from the backend outside the lock."""
+        now = self._clock()
+        with self._lock:
+            totals = self._sessions.get(session)
+            if totals is not None:
+                totals[2] = now
+                return totals
+            if self.backend is not None and now - self._swept > min(self.idle_seconds, 60):
+                self._swept = now
+                self._sessions = {s: t for s, t in self._sessions.items() if now - t[2] <= self.idle_seconds}
+        tokens, cost = self.backend.session_usage(session) if self.backend is not None and session else (0, 0.0)
+        with self._lock:
+            # Another thread may have loaded the session meanwhile
+            return self._sessions.setdefault(session, [tokens, cost, now])
+
+    def session(self, session):
+        """(tokens, cost) spent by `session` so far, including earlier processes."""
+        totals = self._session_totals(session)
+        with self._lock:
+            return totals[0], totals[1]
+
+    def plan(self, session, budget=SESSION_TOKEN_BUDGET, soft_share=SOFT_BUDGET_SHARE):
+        """FULL within budget, SHORT past the soft limit, LOCAL (no model calls) once it is spent."""
+        tokens, _ = self.session(session)
+        if tokens >= budget:
+            return LOCAL
+        if tokens >= budget * soft_share:
+            return SHORT
+        return FULL
+
+    def rows(self):
+        """[(day, session, kind, model, calls, prompt_tokens, output_tokens, estimated, cost)]."""
+        with self._lock:
+            return [(*key, *value) for key, value in sorted(self._rows.items())]
+
+
+ledger = UsageLedger()
+
+
+def report(path):
+    conn = sqlite3.connect(path)
+    queries = [
+        ("per day", "day"),
+        ("per question type", "kind"),
+        ("top sessions", "conversation_id"),
+    ]
+    for title, column in queries:
+        print(title)
+        limit = "LIMIT 10" if column == "conversation_id" else ""
+        order = "SUM(prompt_tokens + output_tokens) DESC" if limit else column
+        for row in conn.execute(
+            f"SELECT {column}, SUM(calls), SUM(prompt_tokens), SUM(output_tokens), SUM(estimated), SUM(cost) "
+            f"FROM usage GROUP BY {column} ORDER BY {order} {limit}"
+        ):
+            name, calls, prompt_tokens, output_tokens, estimated, cost = row
+            print(f"  {name:<34} {calls:>6} answers {prompt_tokens:>9} in {output_tokens:>8} out "
+                  f"({estimated} estimated)  ${cost:.6f}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["report"]:
+        report(sys.argv[2] if len(sys.argv) > 2 else "saanchari_conversations.db")
+    else:
+        print(__doc__)
@@ -0,0 +1,222 @@
+"""Dense passage vectors stored in a memory-mapped NumPy file.
+
+Vectors live in data/kb_vectors.npy and are opened with mmap_mode="r", so every
+Streamlit or API process on a host shares one copy through the page cache.
+Embeddings come from a deterministic hashing embedder (word terms plus
+character trigrams), which needs no network and treats transliteration
+variants such as "Pootharekulu"/"Putharekulu" as near neighbours.
+
+A scan over every vector is bound by memory bandwidth, so large indexes
+search in two passes: the vectors folded to half their dimensions
+(data/kb_vectors_coarse.npy, what the embedder gives at DIM // 2) pick
+RERANK_CANDIDATES rows, which are then scored exactly.
+
+    python -m saanchari.vectors build
+    python -m saanchari.vectors query "sweets from godavari"
+    python -m saanchari.vectors bench [passages] [batch]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+from . import kb
+
+DIM = 256
+# Above this many passages a query is re-scored exactly on this many coarse candidates
+RERANK_CANDIDATES = 2048
+VECTORS_PATH = kb.DATA_DIR / "kb_vectors.npy"
+COARSE_PATH = kb.DATA_DIR / "kb_vectors_coarse.npy"
+META_PATH = kb.DATA_DIR / "kb_vectors.json"
+
+
+class HashingEmbedder:
+    """Map text to an L2-normalised float32 vector by signed feature hashing."""
+
+    def __init__(self, dim=DIM):
+        self.dim = dim
+
+    def features(self, text):
+        for term in kb.tokenize(text):
+            yield term, 1.0
+            padded = f"<{term}>"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], 0.5
+
+    def embed(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self.features(text):
+                h = zlib.crc32(feature.encode())
+                out[row, h % self.dim] += weight if h & 0x80000000 else -weight
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+def fold(vectors):
+    """Add the two halves of each row and re-normalise: the same embedding at half the dimensions."""
+    half = vectors.shape[1] // 2
+    folded = vectors[:, :half] + vectors[:, half:2 * half]
+    norms = np.linalg.norm(folded, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (folded / norms).astype(np.float32)
+
+
+def _top(scores, k):
+    """Indices of the `k` highest scores, best first."""
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+
+class DenseIndex:
+    """Inner-product search over a (possibly memory-mapped) matrix.
+
+    With `coarse` (the folded matrix) and more than RERANK_CANDIDATES rows,
+    the full vectors are only read for the coarse pass's best candidates.
+    """
+
+    def __init__(self, vectors, ids, version=None, embedder=None, coarse=None):
+        self.vectors = vectors
+        self.ids = ids
+        self.version = version
+        self.embedder = embedder or HashingEmbedder(vectors.shape[1])
+        self.coarse = coarse
+
+    @classmethod
+    def open(cls, vectors_path=VECTORS_PATH, meta_path=META_PATH, coarse_path=COARSE_PATH):
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        vectors = np.load(vectors_path, mmap_mode="r")
+        coarse = np.load(coarse_path, mmap_mode="r") if coarse_path.exists() else None
+        if coarse is not None and len(coarse) != len(vectors):
+            coarse = None
+        return cls(vectors, meta["ids"], meta["version"], HashingEmbedder(meta["dim"]), coarse)
+
+    def search_batch(self, queries, k=4):
+        """Return, for each query, up to `k` (cosine, row) pairs, best first."""
+        q = self.embedder.embed(queries)
+        k = min(k, len(self.vectors))
+        if self.coarse is None or len(self.vectors) <= max(RERANK_CANDIDATES, k):
+            scores = self.vectors @ q.T
+            return [[(float(scores[row, column]), int(row)) for row in _top(scores[:, column], k)]
+                    for column in range(len(queries))]
+        coarse_scores = self.coarse @ fold(q).T
+        results = []
+        for column in range(len(queries)):
+            candidates = np.sort(_top(coarse_scores[:, column], RERANK_CANDIDATES))
+            exact = self.vectors[candidates] @ q[column]
+            results.append([(float(exact[i]), int(candidates[i])) for i in _top(exact, k)])
+        return results
+
+    def search(self, query, k=4):
+        return self.search_batch([query], k)[0]
+
+
+def embed_passages(source=kb.SOURCE_PATH):
+    """An in-memory DenseIndex over the knowledge-base passages."""
+    data = json.loads(source.read_text(encoding="utf-8"))
+    embedder = HashingEmbedder()
+    aliases = data.get("tag_aliases", {})
+    texts = [" ".join(kb.passage_terms(p, aliases)) for p in data["passages"]]
+    vectors = embedder.embed(texts)
+    return DenseIndex(vectors, [p["id"] for p in data["passages"]], data["version"], embedder, fold(vectors))
+
+
+def _replace(path, write):
+    """Write `path` through a temporary file, so processes mapping the old file keep a consistent copy."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def build(source=kb.SOURCE_PATH, vectors_path=VECTORS_PATH, meta_path=META_PATH, coarse_path=COARSE_PATH):
+    index = embed_passages(source)
+    meta = {"version": index.version, "dim": index.embedder.dim, "ids": index.ids}
+    _replace(vectors_path, lambda f: np.save(f, index.vectors))
+    _replace(coarse_path, lambda f: np.save(f, index.coarse))
+    # Written last: its version is what readers check
+    _replace(meta_path, lambda f: f.write(json.dumps(meta).encode("utf-8")))
+    return DenseIndex.open(vectors_path, meta_path, coarse_path)
+
+
+_index = None
+
+
+def load_index():
+    """Open the shared vector file, or embed in memory if the knowledge base changed since it was built.
+
+    A stale file is left for `python -m saanchari.vectors build` to replace,
+    since other processes may have it memory-mapped.
+    """
+    global _index
+    if _index is None:
+        index = None
+        if VECTORS_PATH.exists() and META_PATH.exists():
+            index = DenseIndex.open()
+            if index.version != kb.load_index().version:
+                index = None
+        _index = index or embed_passages()
+    return _index
+
+
+def bench(passages=100_000, batch=8, rounds=20, noise=1.0):
+    """Search synthetic passages clustered around the real ones: exact scan against two passes."""
+    real = embed_passages().vectors
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "vectors.npy")
+        vectors = real[rng.integers(len(real), size=passages)]
+        vectors += rng.standard_normal((passages, DIM), dtype=np.float32) * (noise / DIM ** 0.5)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.save(path, vectors)
+        np.save(path + ".coarse.npy", fold(vectors))
+        del vectors
+        exact = DenseIndex(np.load(path, mmap_mode="r"), list(range(passages)))
+        two_pass = DenseIndex(exact.vectors, exact.ids, coarse=np.load(path + ".coarse.npy", mmap_mode="r"))
+        queries = (kb.SAMPLE_QUERIES * batch)[:batch]
+        print(f"{passages} x {DIM} float32 (memory-mapped), {len(real)} real passages plus noise")
+        for label, index in (("exact scan", exact), (f"two passes ({RERANK_CANDIDATES} candidates)", two_pass)):
+            for size in (1, batch):
+                index.search_batch(queries[:size])
+                started = time.perf_counter()
+                for _ in range(rounds):
+                    index.search_batch(queries[:size])
+                elapsed = (time.perf_counter() - started) / rounds
+                print(f"  {label:<28} batch of {size}: {elapsed * 1e3:6.2f} ms/batch, "
+                      f"{elapsed / size * 1e3:5.2f} ms/query")
+        expected = exact.search_batch(kb.SAMPLE_QUERIES)
+        found = two_pass.search_batch(kb.SAMPLE_QUERIES)
+        recall = np.mean([len({r for _, r in a} & {r for _, r in b}) / len(a) for a, b in zip(expected, found)])
+        print(f"  two-pass recall@4 against the exact scan: {recall:.3f}")
+        del exact, two_pass
+
+
+def main(argv):
+    command = argv[0] if argv else "build"
+    if command == "build":
+        index = build()
+        print(f"Built {VECTORS_PATH.name}: {len(index.ids)} x {index.vectors.shape[1]}")
+    elif command == "query":
+        index = load_index()
+        passages = kb.load_index().passages
+        for score, row in index.search(" ".join(argv[1:]), k=5):
+            print(f"{score:6.3f}  {passages[row]['id']:<20} {passages[row]['title']}")
+    elif command == "bench":
+        bench(*(int(arg) for arg in argv[1:3]))
+    else:
+        print(__doc__)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
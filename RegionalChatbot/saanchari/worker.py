@@ -0,0 +1,125 @@
+"""Background answer generation that the UI polls instead of waiting on."""
+import threading
+
+from . import engine
+from .cancel import CancelToken, GenerationCancelled
+
+THINKING = "thinking"
+STREAMING = "streaming"
+DONE = "done"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+FINISHED = (DONE, ERROR, CANCELLED)
+
+
+class ReplyBuffer:
+    """Per-session buffer a worker writes into and the chat fragment reads from."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._parts = []
+        self.status = THINKING
+        self.error = None
+
+    def append(self, text):
+        with self._lock:
+            self._parts.append(text)
+            self.status = STREAMING
+
+    def finish(self, status, error=None):
+        with self._lock:
+            self.status = status
+            self.error = error
+
+    def snapshot(self):
+        """Return (status, text) as one consistent read."""
+        with self._lock:
+            return self.status, "".join(self._parts)
+
+
+class GenerationJob:
+    """Produce one reply on a daemon thread, writing progress into a ReplyBuffer.
+
+    With `reply` set (an English answer found locally) the model call is
+    skipped and only translation runs. `on_done` receives the final text.
+    `prompt` may also be a callable that builds the prompt from `question`
+    once it has been translated from `source_lang` into English.
+    `on_usage` receives the model call's Usage, even if the job is cancelled.
+    `stream`, a callable taking the CancelToken and returning an async
+    iterator of text, replaces the single model call (e.g. a planner's
+    merged sections).
+    """
+
+    def __init__(self, model, prompt, dest_lang="en", is_alive=None, reply=None, on_done=None,
+                 question=None, source_lang="en", generation_config=None, on_usage=None, stream=None):
+        self.model = model
+        self.prompt = prompt
+        self.stream = stream
+        self.question = question
+        self.source_lang = source_lang
+        self.generation_config = generation_config
+        self.on_usage = on_usage
+        self.reply = reply
+        self.on_done = on_done
+        self.dest_lang = dest_lang
+        self.token = CancelToken(is_alive=is_alive)
+        self.buffer = ReplyBuffer()
+        self._thread = threading.Thread(target=self._run, name="saanchari-reply", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self, reason="cancelled"):
+        self.token.cancel(reason)
+
+    @property
+    def finished(self):
+        return self.buffer.status in FINISHED
+
+    def _run(self):
+        token = self.token
+        stage = "generate"
+        # English text is shown as it streams; other languages wait for the translation
+        on_chunk = self.buffer.append if self.dest_lang == "en" else None
+        try:
+            if self.reply is not None:
+                reply = self.reply
+                if on_chunk is not None:
+                    on_chunk(reply)
+            elif self.stream is not None:
+                reply = engine.run_cancellable(engine.collect(self.stream(token), on_chunk), token, stage)
+            else:
+                prompt = self.prompt
+                if callable(prompt):
+                    question = self.question
+                    if self.source_lang != "en":
+                        stage = "translate_input"
+                        question = engine.run_cancellable(
+                            engine.translate_text(question, "en", src=self.source_lang), token, stage
+                        )
+                        stage = "generate"
+                    prompt = prompt(question)
+                reply = engine.run_cancellable(
+                    engine.generate_reply(self.model, prompt, token, on_chunk, self.on_usage, self.generation_config),
+                    token,
+                    stage,
+                )
+            if self.dest_lang != "en":
+                stage = "translate"
+                reply = engine.run_cancellable(
+                    engine.translate_text(reply, self.dest_lang, src="en"), token, stage
+                )
+                self.buffer.append(reply)
+            self.buffer.finish(DONE)
+            engine.record_completed(token)
+            if self.on_done is not None:
+                self.on_done(self.buffer.snapshot()[1].strip())
+        except GenerationCancelled as e:
+            _, partial = self.buffer.snapshot()
+            self.buffer.finish(CANCELLED)
+            engine.record_cancelled(token, e.stage, discarded_chars=len(partial))
+        except Exception as e:
+            self.buffer.finish(ERROR, error=str(e))
+
@@ -4,11 +4,15 @@ import os
 import time
 from googletrans import Translator
 
+from saanchari.cassette import replaying, wrap_model, wrap_translator
+
 # Load environment variables and configure Gemini
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel("gemini-1.5-flash")
+    model = wrap_model(genai.GenerativeModel("gemini-1.5-flash"))
+elif replaying():
+    model = wrap_model(None)
 else:
     st.error("⚠️ GEMINI_API_KEY not found. Please add your API key to continue.")
     st.stop()
@@ -325,7 +329,7 @@ lang_map = {
 }
 
 # Initialize translator
-translator = Translator()
+translator = wrap_translator(Translator())
 
 # Brand Header
 st.markdown("""